@@ -0,0 +1,126 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Формат сегмента записывается в строку: архив читается и после смены зависимостей
+CODEC = "msgpack" if msgpack else "json"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS segments (
+    id INTEGER PRIMARY KEY,
+    created REAL NOT NULL,
+    codec TEXT NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    segment INTEGER NOT NULL REFERENCES segments(id),
+    status TEXT NOT NULL,
+    archived REAL NOT NULL
+);
+"""
+
+def _encode(records):
+    if CODEC == "msgpack":
+        raw = msgpack.packb(records, use_bin_type=True)
+    else:
+        raw = json.dumps(records, ensure_ascii=False, separators=(",", ":")).encode()
+    return zlib.compress(raw, 9)
+
+def _decode(codec, blob):
+    raw = zlib.decompress(blob)
+    if codec == "msgpack":
+        if msgpack is None:
+            raise RuntimeError("Archive segment is msgpack-encoded, but msgpack is not installed")
+        return msgpack.unpackb(raw, raw=False)
+    return json.loads(raw)
+
+class EventArchive:
+    """Холодный слой мероприятий в SQLite.
+
+    Мероприятия пишутся пачками: одна пачка — один сжатый сегмент,
+    таблица events указывает, в каком сегменте лежит id. Методы
+    синхронные, из asyncio их вызывают через asyncio.to_thread.
+    """
+    def __init__(self, path, cached_segments=8):
+        self.path = path
+        self.cached_segments = cached_segments
+        self.segments = OrderedDict()
+        self.lock = threading.Lock()
+        self.conn = None
+
+    def _connect(self):
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.path, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript(SCHEMA)
+        return self.conn
+
+    def write(self, records):
+        """Запись пачки {id: {"status", "event", "media"}} одним сегментом"""
+        now = time.time()
+        with self.lock:
+            conn = self._connect()
+            with conn:
+                segment = conn.execute(
+                    "INSERT INTO segments (created, codec, data) VALUES (?, ?, ?)",
+                    (now, CODEC, _encode(records))
+                ).lastrowid
+                conn.executemany(
+                    "INSERT OR REPLACE INTO events (id, segment, status, archived) VALUES (?, ?, ?, ?)",
+                    [(int(event_id), segment, record["status"], now) for event_id, record in records.items()]
+                )
+        return segment
+
+    def get(self, event_id):
+        """Запись архива ({"status", "event", "media"}) или None"""
+        with self.lock:
+            row = self._connect().execute(
+                "SELECT segment FROM events WHERE id = ?", (int(event_id),)
+            ).fetchone()
+            if row is None:
+                return None
+            return self._segment(row[0]).get(str(event_id))
+
+    def _segment(self, segment):
+        records = self.segments.get(segment)
+        if records is None:
+            codec, data = self.conn.execute(
+                "SELECT codec, data FROM segments WHERE id = ?", (segment,)
+            ).fetchone()
+            records = self.segments[segment] = _decode(codec, data)
+            if len(self.segments) > self.cached_segments:
+                self.segments.popitem(last=False)
+        else:
+            self.segments.move_to_end(segment)
+        return records
+
+    def stats(self):
+        with self.lock:
+            conn = self._connect()
+            events, = conn.execute("SELECT COUNT(*) FROM events").fetchone()
+            segments, stored = conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM segments").fetchone()
+        return {
+            "events": events,
+            "segments": segments,
+            "stored_bytes": stored,
+            "file_bytes": sum(
+                os.path.getsize(path) for path in (self.path, f"{self.path}-wal") if os.path.exists(path)
+            ),
+            "codec": CODEC,
+        }
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
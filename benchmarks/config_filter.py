@@ -0,0 +1,39 @@
+"""Стоимость фильтра "⚙ Настройки рассылки" на один апдейт: до и после снимка Config
+
+Обработчики читают настройки через прокси CurrentConfig (config.admin_ids),
+поэтому замеряется именно он; snapshot() — для сравнения без прокси.
+
+Запуск из корня репозитория:
+    python -m benchmarks.config_filter --admins 50
+"""
+import argparse
+import os
+import timeit
+from types import SimpleNamespace
+
+from config import Config, CurrentConfig
+
+class LegacyConfig:
+    """Прежний Config: окружение читается и разбирается при каждом обращении"""
+    @property
+    def admin_ids(self):
+        raw_ids = os.getenv("ADMIN_IDS", "7724035951").split('#')[0].strip()
+        return [int(i.strip()) for i in raw_ids.split(',') if i.strip().isdigit()]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--admins", type=int, default=50)
+    parser.add_argument("--number", type=int, default=200000)
+    args = parser.parse_args()
+
+    os.environ["ADMIN_IDS"] = ",".join(str(7000000000 + i) for i in range(args.admins))
+    message = SimpleNamespace(from_user=SimpleNamespace(id=1), text="⚙ Настройки рассылки")
+
+    proxy = CurrentConfig(Config.from_env())
+    for name, cfg in (("legacy", LegacyConfig()), ("proxy", proxy), ("snapshot", proxy.snapshot())):
+        check = lambda message: message.from_user.id in cfg.admin_ids and message.text == "⚙ Настройки рассылки"
+        seconds = timeit.timeit(lambda: check(message), number=args.number)
+        print(f"{name:>8}: {seconds / args.number * 1e9:8.0f} ns per update")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Пропускная способность event loop: блокирующий StrictRedis против redis.asyncio
+
+Запуск из корня репозитория (нужен работающий Redis из .env):
+    python -m benchmarks.db_throughput --updates 5000 --concurrency 100
+С --fake-redis оба клиента работают с fakeredis в памяти процесса: запросы
+не уходят в сеть, поэтому цифры показывают накладные расходы клиентов, а
+не ожидание Redis.
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime
+
+import redis
+
+from benchmarks import fake_redis
+from config import config
+
+EVENT = {
+    "title": "Концерт",
+    "description": "Описание мероприятия",
+    "date": "25.10.2026 19:00",
+    "address": "ул. Пушкина, 1",
+    "price": 500,
+    "link": "-",
+    "organizer": "bench",
+    "organizer_id": 1,
+}
+
+class SyncDatabase:
+    """Прежняя реализация: синхронные вызовы прямо из корутин"""
+    def __init__(self, client=None):
+        self.redis = client or redis.StrictRedis(
+            host=config.redis_host,
+            port=config.redis_port,
+            db=config.redis_db,
+            decode_responses=True
+        )
+
+    async def save_user(self, user_id, user_data):
+        self.redis.hset(f"user:{user_id}", mapping=user_data)
+
+    async def get_event(self, event_id):
+        return self.redis.hgetall(f"event:{event_id}")
+
+async def handle_update(db, i):
+    """Имитация обработчика: запись пользователя и чтение мероприятия"""
+    await db.save_user(f"bench:{i % 1000}", {"last_active": datetime.now().isoformat()})
+    await db.get_event("bench:event")
+
+async def run(db, updates, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            await handle_update(db, i)
+
+    # Задержка цикла: насколько опаздывает таймер в 1 мс
+    lags = []
+    stop = asyncio.Event()
+
+    async def probe():
+        loop = asyncio.get_running_loop()
+        while not stop.is_set():
+            start = loop.time()
+            await asyncio.sleep(0.001)
+            lags.append(loop.time() - start - 0.001)
+
+    prober = asyncio.create_task(probe())
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(updates)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await prober
+    return updates / elapsed, max(lags, default=0.0)
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--updates", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--fake-redis", action="store_true", help="fakeredis в памяти процесса вместо Redis из .env")
+    args = parser.parse_args()
+
+    sync_client = None
+    if args.fake_redis:
+        sync_client = fake_redis.sync_client(fake_redis.install())
+    # После install(): пул database.py создаётся при импорте
+    from database import Database
+
+    async_db = Database()
+    await async_db.redis.hset("event:bench:event", mapping=EVENT)
+
+    for name, db in (("sync", SyncDatabase(sync_client)), ("async", async_db)):
+        rate, lag = await run(db, args.updates, args.concurrency)
+        print(f"{name:>5}: {rate:10.0f} updates/s, max loop lag {lag * 1000:.1f} ms")
+
+    await async_db.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
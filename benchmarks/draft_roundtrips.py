@@ -0,0 +1,125 @@
+"""Round trip'ы и байты к Redis на одну заявку мастера /create_event
+
+Сравнивается прежняя схема (state.proxy(): GET и SET всего JSON на каждом
+шаге, затем запись мероприятия) и черновик DraftStore. Используется
+отдельная база Redis, она очищается:
+    python -m benchmarks.draft_roundtrips --submissions 1000 --db 15
+Без Redis — с --fake-redis (пакеты fakeredis и lupa): round trip'ы и байты
+считаются так же.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from redis import asyncio as redis
+
+from benchmarks import fake_redis
+from config import config
+from database import Database
+from drafts import DraftStore
+
+STEPS = [
+    {"title": "Концерт камерной музыки"},
+    {"description": "Вечер барочной музыки в исполнении студентов консерватории. " * 3},
+    {"date": "25.10.2026 19:00", "date_obj": "2026-10-25T19:00:00+03:00"},
+    {"address": "Москва, ул. Большая Никитская, 13"},
+    {"price": 500},
+    {"link": "https://example.com/event"},
+]
+
+class Counting:
+    """Примесь к соединению: счёт отправленных команд и байт"""
+    stats = {"round_trips": 0, "bytes_sent": 0, "bytes_received": 0}
+
+    async def send_packed_command(self, command, check_health=True):
+        if isinstance(command, (bytes, str)):
+            command = [command]
+        self.stats["round_trips"] += 1
+        self.stats["bytes_sent"] += sum(len(chunk) for chunk in command)
+        return await super().send_packed_command(command, check_health)
+
+    async def read_response(self, *args, **kwargs):
+        response = await super().read_response(*args, **kwargs)
+        self.stats["bytes_received"] += len(repr(response))
+        return response
+
+class CountingConnection(Counting, redis.Connection):
+    pass
+
+async def legacy_submission(db, user_id):
+    """Прежний поток: FSM-данные целиком читаются и переписываются на каждом шаге"""
+    data_key, state_key = f"fsm:{user_id}:data", f"fsm:{user_id}:state"
+    data = {"organizer": "bench", "organizer_id": user_id}
+    await db.redis.set(state_key, "EventStates:waiting_for_title")
+    for index, fields in enumerate(STEPS):
+        data = json.loads(await db.redis.get(data_key) or "{}") or data
+        data.update(fields)
+        await db.redis.set(data_key, json.dumps(data))
+        await db.redis.set(state_key, f"EventStates:step{index + 1}")
+    data = json.loads(await db.redis.get(data_key))
+    data["photo"] = "AgACAgIAAxkBAAIBQ2"
+    await db.redis.set(data_key, json.dumps(data))
+    await db.save_event(data)
+    await db.redis.delete(state_key, data_key)
+
+async def draft_submission(drafts, db, user_id):
+    """Новый поток: одно поле за шаг, продвижение черновика одним скриптом"""
+    state_key = f"fsm:{user_id}:state"
+    await drafts.start(user_id, {"organizer": "bench", "organizer_id": user_id})
+    await db.redis.set(state_key, "EventStates:waiting_for_title")
+    for index, fields in enumerate(STEPS):
+        await drafts.set(user_id, **fields)
+        await db.redis.set(state_key, f"EventStates:step{index + 1}")
+    # Как в submit_draft: черновик читается для поиска повторов и индексации
+    draft = await drafts.get(user_id)
+    await drafts.promote(user_id, draft, photo="AgACAgIAAxkBAAIBQ2")
+    await db.redis.delete(state_key)
+
+async def measure(name, submissions, run):
+    stats = Counting.stats
+    for key in stats:
+        stats[key] = 0
+    start = time.perf_counter()
+    for user_id in range(submissions):
+        await run(user_id)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name:>6}: {stats['round_trips'] / submissions:5.1f} round trips, "
+        f"{stats['bytes_sent'] / submissions:7.0f} B sent, "
+        f"{stats['bytes_received'] / submissions:6.0f} B received per submission, "
+        f"{submissions / elapsed:6.0f} submissions/s"
+    )
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--submissions", type=int, default=1000)
+    parser.add_argument("--db", type=int, default=15)
+    parser.add_argument("--fake-redis", action="store_true", help="fakeredis в памяти процесса вместо Redis из .env")
+    args = parser.parse_args()
+
+    if args.fake_redis:
+        pool = redis.ConnectionPool(
+            server=fake_redis.install(), decode_responses=True,
+            connection_class=fake_redis.connection_class(Counting)
+        )
+    else:
+        pool = redis.ConnectionPool(
+            host=config.redis_host, port=config.redis_port, db=args.db,
+            decode_responses=True, connection_class=CountingConnection
+        )
+    db = Database(pool)
+    drafts = DraftStore(db)
+    await db.redis.flushdb()
+    # Скрипты загружаются заранее, чтобы не учитывать SCRIPT LOAD
+    await legacy_submission(db, -1)
+    await draft_submission(drafts, db, -2)
+
+    await measure("legacy", args.submissions, lambda user_id: legacy_submission(db, user_id))
+    await measure("draft", args.submissions, lambda user_id: draft_submission(drafts, db, user_id))
+
+    await db.redis.flushdb()
+    await db.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,75 @@
+"""Стресс-проверка гонок модерации: ни одно мероприятие не попадает в два статуса
+
+Запуск из корня репозитория; используется отдельная база Redis, она очищается:
+    python -m benchmarks.event_transitions --events 2000 --admins 8 --db 15
+Без Redis — с --fake-redis (пакеты fakeredis и lupa).
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from redis import asyncio as redis
+
+from benchmarks import fake_redis
+from config import config
+from database import Database
+
+TARGETS = ("published_events", "rejected_events", "scheduled_events")
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--admins", type=int, default=8)
+    parser.add_argument("--db", type=int, default=15)
+    parser.add_argument("--fake-redis", action="store_true", help="fakeredis в памяти процесса вместо Redis из .env")
+    args = parser.parse_args()
+
+    if args.fake_redis:
+        fake_redis.install()
+    # Как в database.py: при исчерпании пула запросы ждут соединение
+    pool = redis.BlockingConnectionPool.from_url(
+        f"redis://{config.redis_host}:{config.redis_port}/{args.db}",
+        decode_responses=True,
+        max_connections=config.redis_max_connections
+    )
+    db = Database(pool)
+    await db.redis.flushdb()
+
+    # Параллельная выдача id: все id уникальны
+    start = time.perf_counter()
+    ids = await asyncio.gather(*(
+        db.save_event({"title": f"Событие {i}", "organizer_id": i}) for i in range(args.events)
+    ))
+    saved = time.perf_counter() - start
+    assert len(set(ids)) == args.events, "duplicate event ids"
+
+    # Каждый администратор пытается перевести каждое мероприятие в случайный статус
+    wins = {}
+
+    async def admin(rng):
+        for event_id in rng.sample(ids, len(ids)):
+            target = rng.choice(TARGETS)
+            if await db.move_event(event_id, "pending_events", target):
+                assert event_id not in wins, f"event {event_id} moved twice"
+                wins[event_id] = target
+
+    start = time.perf_counter()
+    await asyncio.gather(*(admin(random.Random(seed)) for seed in range(args.admins)))
+    moved = time.perf_counter() - start
+
+    assert await db.count_events("pending_events") == 0
+    seen = {}
+    for status in TARGETS:
+        for event_id in await db.redis.zrange(status, 0, -1):
+            assert event_id not in seen, f"event {event_id} in {seen.get(event_id)} and {status}"
+            seen[event_id] = status
+    assert seen == {str(event_id): status for event_id, status in wins.items()}
+
+    print(f"save_event: {args.events / saved:8.0f} ops/s")
+    print(f"move_event: {args.events * args.admins / moved:8.0f} attempts/s, {len(wins)} transitions, no conflicts")
+    await db.redis.flushdb()
+    await db.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
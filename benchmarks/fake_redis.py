@@ -0,0 +1,36 @@
+"""Redis в памяти процесса для бенчмарков (пакет fakeredis, для Lua нужен lupa)
+
+install() нужно вызвать до импорта модулей бота: пул из database.py
+создаётся при импорте через ConnectionPool.from_url.
+"""
+from redis import asyncio as redis
+
+def _fakeredis():
+    try:
+        import fakeredis
+    except ImportError:
+        raise SystemExit("fakeredis is not installed: pip install fakeredis lupa, or pass --redis redis://...")
+    return fakeredis
+
+def connection_class(mixin=None):
+    """Асинхронное соединение fakeredis; mixin — свой класс поверх него (счётчики)"""
+    from fakeredis.aioredis import FakeAsyncRedisConnection
+    if mixin is None:
+        return FakeAsyncRedisConnection
+    return type(f"Fake{mixin.__name__}", (mixin, FakeAsyncRedisConnection), {})
+
+def sync_client(server):
+    """Синхронный клиент к тому же серверу в памяти"""
+    return _fakeredis().FakeStrictRedis(server=server, decode_responses=True)
+
+def install():
+    server = _fakeredis().FakeServer()
+    fake_connection = connection_class()
+
+    def from_url(cls, url, **kwargs):
+        kwargs.pop("connection_class", None)
+        return cls(connection_class=fake_connection, server=server, **kwargs)
+
+    # classmethod: BlockingConnectionPool.from_url тоже создаёт свой класс
+    redis.ConnectionPool.from_url = classmethod(from_url)
+    return server
@@ -0,0 +1,82 @@
+"""Локальный фейковый Bot API: запоминает запросы, добавляет задержку и 429
+
+Бот направляется сюда через TELEGRAM_API_URL=http://host:port.
+"""
+import asyncio
+import itertools
+import random
+import time
+
+from aiohttp import web
+
+class FakeTelegram:
+    def __init__(self, latency=0.05, jitter=0.02, flood_rate=0.0, retry_after=1, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.flood_rate = flood_rate
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.message_ids = itertools.count(1)
+        self.requests = []
+        self.runner = None
+
+    def count(self, *methods):
+        return sum(1 for request in self.requests if request["method"] in methods and request["ok"])
+
+    async def handle(self, request):
+        method = request.match_info["method"]
+        if request.content_type == "application/json":
+            params = await request.json()
+        else:
+            params = dict(await request.post())
+        await asyncio.sleep(max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter)))
+
+        flood = method.startswith("send") and self.rng.random() < self.flood_rate
+        self.requests.append({
+            "method": method,
+            "chat_id": params.get("chat_id"),
+            "at": time.monotonic(),
+            "ok": not flood,
+        })
+        if flood:
+            return web.json_response({
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            })
+        return web.json_response({"ok": True, "result": self.result(method, params)})
+
+    def result(self, method, params):
+        if method == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+        if method in ("sendMessage", "sendPhoto", "editMessageText"):
+            return self.message(params)
+        if method == "sendMediaGroup":
+            return [self.message(params)]
+        if method == "getUpdates":
+            return []
+        return True
+
+    def message(self, params):
+        chat_id = int(params.get("chat_id") or 0)
+        return {
+            "message_id": next(self.message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "channel" if chat_id < 0 else "private"},
+            "text": params.get("text") or params.get("caption") or "",
+        }
+
+    async def start(self, host="127.0.0.1", port=0):
+        """Запуск сервера; возвращает базовый URL"""
+        app = web.Application(client_max_size=20 * 1024 * 1024)
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return f"http://{host}:{port}"
+
+    async def stop(self):
+        await self.runner.cleanup()
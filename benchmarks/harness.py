@@ -0,0 +1,294 @@
+"""Нагрузочные сценарии бота целиком: фейковый Bot API и Redis в памяти
+
+Запуск из корня репозитория:
+    python -m benchmarks.harness --scenario all --output bench_output.txt
+    python -m benchmarks.harness --scenario wizard --organizers 500 --redis redis://localhost:6379/15
+
+Сценарии:
+    wizard      — N организаторов одновременно проходят мастер /create_event
+    moderation  — всплеск модерации: администраторы публикуют очередь
+    broadcast   — массовая рассылка неактивным организаторам
+
+Результат — JSON на сценарий (пропускная способность, задержки, Redis
+round trip'ы на апдейт, запросы к Bot API), его удобно сравнивать между
+коммитами. Указанная через --redis база очищается.
+
+Бот написан под aiogram 3: main.py импортируется целиком и апдейты идут
+через Dispatcher.feed_update, как в рабочем режиме.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import subprocess
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+
+from benchmarks.fake_telegram import FakeTelegram
+
+ADMIN_BASE = 900000
+ORGANIZER_BASE = 100000
+
+WIZARD_START = datetime(2030, 12, 25, 19, 0)
+
+def wizard_steps(index):
+    """Шаги мастера для организатора index.
+
+    Название, дата и адрес у каждого свои: одинаковые заявки разных
+    организаторов поиск повторов слил бы в одно мероприятие, и сценарий
+    измерял бы не подачу заявок, а слияние.
+    """
+    date = WIZARD_START + timedelta(hours=index)
+    return [
+        "/start",
+        "/create_event",
+        f"Концерт камерной музыки №{index}",
+        "Вечер барочной музыки в исполнении студентов консерватории",
+        date.strftime("%d.%m.%Y %H:%M"),
+        f"Москва, ул. Большая Никитская, {index + 1}",
+        "500",
+        "https://example.com/event",
+        "-",
+    ]
+
+update_ids = itertools.count(1)
+
+def message_update(user_id, text):
+    update_id = next(update_ids)
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Bench", "username": f"user{user_id}"},
+            "text": text,
+        },
+    }
+
+def callback_update(user_id, data):
+    update_id = next(update_ids)
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "chat_instance": str(user_id),
+            "from": {"id": user_id, "is_bot": False, "first_name": "Admin"},
+            "data": data,
+        },
+    }
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else 0.0
+
+class Run:
+    """Подача апдейтов в диспетчер с замером задержки каждого"""
+    def __init__(self, app):
+        self.app = app
+        self.latencies = []
+
+    async def feed(self, raw):
+        from aiogram.types import Update
+        update = Update.model_validate(raw, context={"bot": self.app.bot})
+        start = time.perf_counter()
+        await self.app.dp.feed_update(self.app.bot, update)
+        self.latencies.append(time.perf_counter() - start)
+
+def redis_round_trips():
+    import metrics
+    return sum(sum(counts) for counts, _ in metrics.redis_latency.values.values())
+
+def reset_counters(telegram):
+    import metrics
+    metrics.redis_latency.values.clear()
+    telegram.requests.clear()
+
+async def wait_background():
+    import utils
+    while utils.background_tasks:
+        await asyncio.gather(*list(utils.background_tasks), return_exceptions=True)
+
+def report(name, params, run, elapsed, telegram):
+    methods = {}
+    for request in telegram.requests:
+        methods[request["method"]] = methods.get(request["method"], 0) + 1
+    updates = len(run.latencies)
+    return {
+        "scenario": name,
+        "params": params,
+        "updates": updates,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_per_s": round(updates / elapsed, 1) if elapsed else None,
+        "latency_ms": {
+            "p50": round(percentile(run.latencies, 0.5) * 1000, 2),
+            "p99": round(percentile(run.latencies, 0.99) * 1000, 2),
+            "max": round(max(run.latencies, default=0) * 1000, 2),
+        },
+        "redis_round_trips_per_update": round(redis_round_trips() / updates, 2) if updates else None,
+        "telegram_requests": methods,
+        "telegram_429": sum(1 for request in telegram.requests if not request["ok"]),
+    }
+
+async def scenario_wizard(app, telegram, args):
+    reset_counters(telegram)
+    run = Run(app)
+
+    async def organizer(index):
+        for text in wizard_steps(index):
+            await run.feed(message_update(ORGANIZER_BASE + index, text))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(organizer(i) for i in range(args.organizers)))
+    await wait_background()
+    elapsed = time.perf_counter() - start
+
+    pending = await app.db.count_events("pending_events")
+    assert pending >= args.organizers, f"only {pending} events reached moderation"
+    return report("wizard", {"organizers": args.organizers}, run, elapsed, telegram)
+
+async def scenario_moderation(app, telegram, args):
+    import callbacks
+    from outbox import outbox
+
+    ids = [
+        await app.db.save_event({"title": f"Событие {i}", "organizer_id": ORGANIZER_BASE + i, "organizer": "bench"})
+        for i in range(args.events)
+    ]
+    reset_counters(telegram)
+    run = Run(app)
+    worker = asyncio.create_task(outbox.run())
+
+    async def admin(index):
+        # Администраторы идут по очереди с разных концов: часть нажатий — гонки
+        order = ids if index % 2 == 0 else list(reversed(ids))
+        for event_id in order[index::args.admins] + order[:args.events // 10]:
+            await run.feed(callback_update(ADMIN_BASE + index, callbacks.encode(callbacks.PUBLISH, event_id)))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(admin(index) for index in range(args.admins)))
+    while await app.db.redis.zcard("publish_outbox") or await app.db.redis.zcard("publish_inflight"):
+        await asyncio.sleep(0.05)
+    await wait_background()
+    elapsed = time.perf_counter() - start
+    outbox.stop()
+    worker.cancel()
+
+    posts = [r for r in telegram.requests if r["method"] in ("sendMessage", "sendPhoto") and r["ok"]
+             and str(r["chat_id"]) == str(app.config.channel_id)]
+    assert len(posts) == args.events, f"{len(posts)} channel posts for {args.events} events"
+    params = {"events": args.events, "admins": args.admins, "channel_rate": args.channel_rate}
+    return report("moderation", params, run, elapsed, telegram)
+
+async def scenario_broadcast(app, telegram, args):
+    import broadcast
+
+    idle = (datetime.now() - timedelta(days=30)).isoformat()
+    for offset in range(0, args.users, 500):
+        await asyncio.gather(*(
+            app.db.save_user(ORGANIZER_BASE + i, {"username": f"user{i}", "last_active": idle})
+            for i in range(offset, min(offset + 500, args.users))
+        ))
+    reset_counters(telegram)
+    run = Run(app)
+
+    start = time.perf_counter()
+    admin_id = ADMIN_BASE
+    # Рассылка запускается через тот же диалог администратора
+    await run.feed(message_update(admin_id, "⚙ Настройки рассылки"))
+    await run.feed(message_update(admin_id, "Мы соскучились! Создайте новое мероприятие: /create_event"))
+    await run.feed(message_update(admin_id, "7"))
+    while await app.db.redis.scard(broadcast.ACTIVE_JOBS):
+        await asyncio.sleep(0.05)
+    await wait_background()
+    elapsed = time.perf_counter() - start
+
+    result = report("broadcast", {"users": args.users, "rate_limit": args.rate_limit}, run, elapsed, telegram)
+    sent = sum(1 for r in telegram.requests if r["method"] == "sendMessage" and r["ok"]
+               and int(r["chat_id"]) != admin_id)
+    result["messages_per_s"] = round(sent / elapsed, 1)
+    return result
+
+SCENARIOS = {
+    "wizard": scenario_wizard,
+    "moderation": scenario_moderation,
+    "broadcast": scenario_broadcast,
+}
+
+def configure_env(args, api_url):
+    """Окружение задаётся до импорта бота: Config читается один раз"""
+    os.environ.update({
+        "BOT_TOKEN": "123456:BENCHMARK",
+        "TELEGRAM_API_URL": api_url,
+        "ADMIN_IDS": ",".join(str(ADMIN_BASE + i) for i in range(args.admins)),
+        "CHANNEL_ID": "-1000000000001",
+        "RATE_LIMIT_GLOBAL": str(args.rate_limit),
+        "RATE_LIMIT_PER_CHAT": str(args.chat_rate),
+        "RATE_LIMIT_CHANNEL": str(args.channel_rate),
+        "METRICS_PORT": "0",
+        "WEBHOOK_URL": "",
+        "STREAM_SHARDS": "0",
+    })
+    if args.redis == "fake":
+        from benchmarks import fake_redis
+        fake_redis.install()
+    else:
+        url = urlparse(args.redis)
+        os.environ.update({
+            "REDIS_HOST": url.hostname or "localhost",
+            "REDIS_PORT": str(url.port or 6379),
+            "REDIS_DB": url.path.lstrip("/") or "15",
+        })
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS) + ["all"], default="all")
+    parser.add_argument("--organizers", type=int, default=200)
+    parser.add_argument("--events", type=int, default=300)
+    parser.add_argument("--admins", type=int, default=5)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--rate-limit", type=float, default=30)
+    parser.add_argument("--chat-rate", type=float, default=1, help="сообщений в секунду в один чат")
+    parser.add_argument("--channel-rate", type=float, default=1800,
+                        help="постов в канал в минуту; у Telegram около 20, по умолчанию не ограничивает")
+    parser.add_argument("--latency", type=float, default=0.05, help="задержка фейкового Bot API, с")
+    parser.add_argument("--flood-rate", type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument("--redis", default="fake", help="'fake' или redis://host:port/db")
+    parser.add_argument("--output", help="дописать JSON-строки в файл")
+    args = parser.parse_args()
+
+    telegram = FakeTelegram(latency=args.latency, flood_rate=args.flood_rate)
+    configure_env(args, await telegram.start())
+
+    import main as app
+    await app.db.redis.flushdb()
+
+    names = sorted(SCENARIOS) if args.scenario == "all" else [args.scenario]
+    results = []
+    for name in names:
+        result = await SCENARIOS[name](app, telegram, args)
+        result["commit"] = git_revision()
+        results.append(result)
+        print(json.dumps(result, ensure_ascii=False))
+        await app.db.redis.flushdb()
+
+    if args.output:
+        with open(args.output, "a") as output:
+            for result in results:
+                output.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+    await app.outbound.close()
+    await app.db.close()
+    await telegram.stop()
+    app.stop_logging()
+
+if __name__ == "__main__":
+    asyncio.run(main())
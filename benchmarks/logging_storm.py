@@ -0,0 +1,78 @@
+"""Задержка event loop во время шквала ошибок в логе: прямые обработчики против очереди
+
+Запуск из корня репозитория (лог пишется во временный каталог):
+    python -m benchmarks.logging_storm --records 20000 --mode direct
+    python -m benchmarks.logging_storm --records 20000 --mode queued
+
+Режимы запускаются отдельными процессами, чтобы конфигурации не смешивались.
+"""
+import argparse
+import asyncio
+import logging
+import logging.config
+import os
+import sys
+import tempfile
+
+from logging_setup import setup_logging, stop_logging
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+async def storm(records, tasks):
+    logger = logging.getLogger("event_bot")
+    root_logger = logging.getLogger("benchmarks")
+    per_task = records // tasks
+
+    async def fail(index):
+        for i in range(per_task):
+            try:
+                raise ConnectionError(f"admin {index}: connection reset")
+            except ConnectionError as e:
+                logger.error(f"Error sending event to admin {index}: {e}", exc_info=True)
+                root_logger.error(f"Error sending event to admin {index}: {e}")
+            await asyncio.sleep(0)
+
+    lags = []
+    done = asyncio.Event()
+
+    async def probe():
+        loop = asyncio.get_running_loop()
+        while not done.is_set():
+            start = loop.time()
+            await asyncio.sleep(0.001)
+            lags.append(loop.time() - start - 0.001)
+
+    prober = asyncio.create_task(probe())
+    await asyncio.gather(*(fail(index) for index in range(tasks)))
+    done.set()
+    await prober
+    return lags
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--mode", choices=("direct", "queued"), default="queued")
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument("--tasks", type=int, default=50)
+    args = parser.parse_args()
+
+    conf = os.path.abspath("logging.conf")
+    os.chdir(tempfile.mkdtemp())
+    # stdout-обработчик из logging.conf пишет в /dev/null, результаты — в stderr
+    sys.stdout = open(os.devnull, "w")
+    if args.mode == "direct":
+        logging.config.fileConfig(conf, disable_existing_loggers=False)
+    else:
+        setup_logging(conf)
+
+    lags = asyncio.run(storm(args.records, args.tasks))
+    stop_logging()
+    print(
+        f"{args.mode:>6}: loop lag p50 {percentile(lags, 0.5) * 1000:.2f} ms, "
+        f"p99 {percentile(lags, 0.99) * 1000:.2f} ms, max {max(lags) * 1000:.2f} ms",
+        file=sys.stderr
+    )
+
+if __name__ == "__main__":
+    main()
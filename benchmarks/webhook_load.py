@@ -0,0 +1,63 @@
+"""Нагрузка на webhook синтетическими апдейтами: p50/p99 времени ответа
+
+Запуск из корня репозитория при работающем боте в режиме webhook:
+    python -m benchmarks.webhook_load --url http://localhost:8080/webhook --updates 10000 --concurrency 200
+"""
+import argparse
+import asyncio
+import itertools
+import time
+
+import aiohttp
+
+from config import config
+from webhook import SECRET_HEADER
+
+def synthetic_update(update_id, user_id):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Load", "username": f"load{user_id}"},
+            "text": "/start",
+        },
+    }
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", default=f"http://localhost:{config.webhook_port}{config.webhook_path}")
+    parser.add_argument("--secret", default=config.webhook_secret)
+    parser.add_argument("--updates", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    args = parser.parse_args()
+
+    counter = itertools.count(1)
+    latencies, statuses = [], {}
+
+    async def client(session):
+        while (update_id := next(counter)) <= args.updates:
+            payload = synthetic_update(update_id, 1000000 + update_id % args.users)
+            start = time.perf_counter()
+            async with session.post(args.url, json=payload, headers={SECRET_HEADER: args.secret}) as response:
+                await response.read()
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status] = statuses.get(response.status, 0) + 1
+
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        start = time.perf_counter()
+        await asyncio.gather(*(client(session) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+
+    print(f"updates: {len(latencies)}, {len(latencies) / elapsed:.0f}/s, statuses: {statuses}")
+    print(f"p50: {percentile(latencies, 0.5) * 1000:.2f} ms, p99: {percentile(latencies, 0.99) * 1000:.2f} ms")
+
+if __name__ == "__main__":
+    asyncio.run(main())
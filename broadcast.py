@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+from datetime import datetime
+
+from database import db
+from outbound import bot
+from ratelimit import limiter
+from utils import run_in_background
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_JOBS = "broadcast_jobs"
+BATCH_SIZE = 100
+LEASE_SECONDS = 60
+PROGRESS_INTERVAL = 5
+# Значение аренды — владелец: после быстрого перезапуска чужая аренда
+# истекает, и задание подхватывает периодический обход
+INSTANCE = f"{socket.gethostname()}:{os.getpid()}"
+
+# Задания, которые обрабатывает этот процесс
+running = set()
+
+def _job_key(job_id):
+    return f"broadcast:{job_id}"
+
+async def create_job(admin_id, message, frequency):
+    """Создание задания рассылки и запуск его обработки"""
+    job_id = await db.redis.incr("broadcast:next_id")
+    progress = await bot.send_message(admin_id, f"Рассылка #{job_id}: подбор получателей...")
+    await db.redis.hset(_job_key(job_id), mapping={
+        "admin_id": admin_id,
+        "message": message,
+        "frequency": frequency,
+        "status": "collecting",
+        "cursor": 0,
+        "total": 0,
+        "sent": 0,
+        "failed": 0,
+        "progress_message_id": progress.message_id,
+        "created_at": datetime.now().isoformat()
+    })
+    await db.redis.sadd(ACTIVE_JOBS, job_id)
+    run_in_background(run_job(job_id))
+    return job_id
+
+async def resume_jobs():
+    """Продолжение незавершённых рассылок, брошенных другим процессом"""
+    for job_id in await db.redis.smembers(ACTIVE_JOBS):
+        if job_id not in running:
+            run_in_background(run_job(job_id))
+
+async def resume_periodically():
+    """Повторный обход заданий: аренда упавшего процесса истекает не сразу"""
+    while True:
+        await asyncio.sleep(LEASE_SECONDS)
+        try:
+            await resume_jobs()
+        except Exception as e:
+            logger.error(f"Cannot resume broadcast jobs: {e!r}")
+
+async def run_job(job_id):
+    """Обработка задания, пока этот процесс держит его аренду"""
+    job_id = str(job_id)
+    key = _job_key(job_id)
+    lease = f"{key}:lease"
+    if job_id in running or not await db.redis.set(lease, INSTANCE, nx=True, ex=LEASE_SECONDS):
+        return
+    running.add(job_id)
+    try:
+        job = await db.redis.hgetall(key)
+        if not job:
+            await db.redis.srem(ACTIVE_JOBS, job_id)
+            return
+        if job["status"] == "collecting":
+            await _collect_recipients(key, int(job["frequency"]))
+        await _send_all(key, lease, job)
+    finally:
+        running.discard(job_id)
+        await db.release_lease(lease, INSTANCE)
+
+async def _collect_recipients(key, frequency):
+    """Список получателей фиксируется один раз, чтобы курсор был устойчив"""
+    recipients = f"{key}:recipients"
+    await db.redis.delete(recipients)
+    async for chunk in db.iter_inactive_organizers(frequency):
+        await db.redis.rpush(recipients, *chunk)
+    total = await db.redis.llen(recipients)
+    await db.redis.hset(key, mapping={"status": "sending", "total": total})
+
+async def _send_one(user_id, text):
+    try:
+        await limiter.call(user_id, lambda: bot.send_message(chat_id=user_id, text=text))
+        return True
+    except Exception as e:
+        logger.error(f"Error sending notification to {user_id}: {e}")
+        return False
+
+async def _send_all(key, lease, job):
+    recipients = f"{key}:recipients"
+    cursor = int(job["cursor"])
+    last_report = 0.0
+    while True:
+        batch = await db.redis.lrange(recipients, cursor, cursor + BATCH_SIZE - 1)
+        if not batch:
+            break
+        results = await asyncio.gather(*(_send_one(user_id, job["message"]) for user_id in batch))
+        delivered = [user_id for user_id, ok in zip(batch, results) if ok]
+        await db.mark_notified(delivered, datetime.now().isoformat())
+
+        # Курсор и счётчики сдвигаются одной транзакцией после отправки пачки
+        cursor += len(batch)
+        async with db.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(key, "cursor", cursor)
+            pipe.hincrby(key, "sent", len(delivered))
+            pipe.hincrby(key, "failed", len(batch) - len(delivered))
+            await pipe.execute()
+        if not await db.renew_lease(lease, INSTANCE, LEASE_SECONDS):
+            # Аренда истекла и задание забрал другой процесс — он продолжит с курсора
+            logger.warning(f"Lost lease on {key} at cursor {cursor}")
+            return
+
+        if time.monotonic() - last_report >= PROGRESS_INTERVAL:
+            last_report = time.monotonic()
+            await _report(key)
+
+    async with db.redis.pipeline(transaction=True) as pipe:
+        pipe.hset(key, "status", "done")
+        pipe.delete(recipients)
+        pipe.srem(ACTIVE_JOBS, key.split(":", 1)[1])
+        await pipe.execute()
+    await _report(key)
+
+async def _report(key):
+    """Обновление сообщения о ходе рассылки у администратора"""
+    job = await db.redis.hgetall(key)
+    job_id = key.split(":", 1)[1]
+    if job["status"] == "done":
+        text = (
+            f"Рассылка #{job_id} завершена. Отправлено {job['sent']} из {job['total']}, "
+            f"ошибок: {job['failed']}. Следующая рассылка через {job['frequency']} дней."
+        )
+    else:
+        text = f"Рассылка #{job_id}: {job['cursor']}/{job['total']}, ошибок: {job['failed']}"
+    try:
+        await bot.edit_message_text(
+            text,
+            chat_id=int(job["admin_id"]),
+            message_id=int(job["progress_message_id"])
+        )
+    except Exception as e:
+        logger.warning(f"Cannot update broadcast progress {job_id}: {e}")
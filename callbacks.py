@@ -0,0 +1,87 @@
+import base64
+import binascii
+import logging
+import struct
+
+from metrics import handler_label
+
+logger = logging.getLogger(__name__)
+
+VERSION = 1
+
+# Коды действий; номера не переиспользуются — старые кнопки должны ломаться явно
+EDIT = 1
+EDIT_FIELD = 2
+BACK = 3
+SCHEDULE = 4
+PUBLISH = 5
+REJECT = 6
+OPEN = 7
+PENDING_PAGE = 8
+SELECT = 9
+BULK_PUBLISH = 10
+BULK_SCHEDULE = 11
+BULK_REJECT = 12
+CLEAR_SELECTION = 13
+SEARCH_PAGE = 14
+
+# версия, действие, аргумент (id мероприятия или смещение), индекс поля
+_PACKET = struct.Struct(">BBQB")
+# версия, действие, курсор страницы (score, id последнего элемента)
+_CURSOR = struct.Struct(">BBdQ")
+
+def encode(action, arg=0, field=0):
+    """callback_data: 11 байт в base64url без выравнивания (15 символов)"""
+    packed = _PACKET.pack(VERSION, action, int(arg), field)
+    return base64.urlsafe_b64encode(packed).rstrip(b"=").decode()
+
+def encode_cursor(action, score, member):
+    """callback_data с курсором (score, id): 18 байт (24 символа)"""
+    packed = _CURSOR.pack(VERSION, action, score, int(member))
+    return base64.urlsafe_b64encode(packed).rstrip(b"=").decode()
+
+def decode(data):
+    """(действие, аргумент, индекс поля); ValueError для чужих и устаревших данных.
+
+    Для курсора аргумент — пара (score, id).
+    """
+    try:
+        packed = base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+    except (binascii.Error, ValueError):
+        raise ValueError(f"Malformed callback data: {data!r}")
+    if len(packed) == _CURSOR.size:
+        version, action, score, member = _CURSOR.unpack(packed)
+        arg, field = (score, member), 0
+    elif len(packed) == _PACKET.size:
+        version, action, arg, field = _PACKET.unpack(packed)
+    else:
+        raise ValueError(f"Malformed callback data: {data!r}")
+    if version != VERSION:
+        raise ValueError(f"Unsupported callback version {version}")
+    return action, arg, field
+
+class CallbackRouter:
+    """Один обработчик callback-запросов с выбором действия по словарю"""
+    def __init__(self):
+        self.handlers = {}
+
+    def register(self, action):
+        def decorator(handler):
+            if action in self.handlers:
+                raise ValueError(f"Action {action} is already registered")
+            self.handlers[action] = handler
+            return handler
+        return decorator
+
+    async def dispatch(self, callback_query, state):
+        try:
+            action, arg, field = decode(callback_query.data)
+            handler = self.handlers[action]
+        except (ValueError, KeyError):
+            logger.warning(f"Unknown callback data: {callback_query.data!r}")
+            await callback_query.answer("Кнопка устарела, откройте мероприятие заново.", show_alert=True)
+            return
+        handler_label.set(handler.__name__)
+        await handler(callback_query, state, arg, field)
+
+router = CallbackRouter()
@@ -1,44 +1,131 @@
 import os
-from dotenv import load_dotenv
+from dataclasses import dataclass
+from dotenv import dotenv_values, load_dotenv
 
+# Переменные, которых нет в окружении процесса и которые пришли из .env:
+# при перезагрузке они перечитываются из .env, остальное окружение главнее
+_DOTENV_ONLY = frozenset(dotenv_values()) - frozenset(os.environ)
 load_dotenv()
 
+def _parse_admin_ids(raw):
+    raw_ids = raw.split('#')[0].strip()
+    return frozenset(int(i.strip()) for i in raw_ids.split(',') if i.strip().isdigit())
+
+@dataclass(frozen=True)
 class Config:
-    @property
-    def bot_token(self):
-        return os.getenv("BOT_TOKEN", "7706032185:AAFF7LzJyAlrwp1IdAhum0GwtXWdPQTQcog")
-    
+    """Снимок настроек: окружение читается один раз при загрузке"""
+    bot_token: str
+    admin_ids: frozenset
+    channel_id: int
+    timezone: str
+    redis_host: str
+    redis_port: int
+    redis_db: int
+    redis_max_connections: int
+    bot_connections_limit: int
+    telegram_api_url: str
+    rate_limit_global: float
+    rate_limit_per_chat: float
+    # Посты в канал, сообщений в минуту: у каналов и групп лимит Telegram свой
+    rate_limit_channel: float
+    render_cache_size: int
+    webhook_url: str
+    webhook_path: str
+    webhook_secret: str
+    webhook_host: str
+    webhook_port: int
+    webhook_workers: int
+    webhook_queue_size: int
+    stream_shards: int
+    stream_maxlen: int
+    log_format: str
+    log_sample_burst: int
+    log_sample_window: float
+    metrics_host: str
+    metrics_port: int
+    slow_updates_size: int
+    profile_sample_rate: float
+    archive_path: str
+    archive_owner: str
+    archive_rejected_days: int
+    archive_batch_size: int
+    archive_interval: int
+
+    @classmethod
+    def from_env(cls, env=os.environ):
+        return cls(
+            bot_token=env.get("BOT_TOKEN", "7706032185:AAFF7LzJyAlrwp1IdAhum0GwtXWdPQTQcog"),
+            admin_ids=_parse_admin_ids(env.get("ADMIN_IDS", "7724035951")),
+            channel_id=int(env.get("CHANNEL_ID", "-1002629002336")),
+            timezone=env.get("TIMEZONE", "Europe/Moscow"),
+            redis_host=env.get("REDIS_HOST", "localhost"),
+            redis_port=int(env.get("REDIS_PORT", "6379")),
+            redis_db=int(env.get("REDIS_DB", "0")),
+            redis_max_connections=int(env.get("REDIS_MAX_CONNECTIONS", "100")),
+            bot_connections_limit=int(env.get("BOT_CONNECTIONS_LIMIT", "100")),
+            telegram_api_url=env.get("TELEGRAM_API_URL", ""),
+            rate_limit_global=float(env.get("RATE_LIMIT_GLOBAL", "30")),
+            rate_limit_per_chat=float(env.get("RATE_LIMIT_PER_CHAT", "1")),
+            rate_limit_channel=float(env.get("RATE_LIMIT_CHANNEL", "20")),
+            render_cache_size=int(env.get("RENDER_CACHE_SIZE", "1024")),
+            webhook_url=env.get("WEBHOOK_URL", "").rstrip("/"),
+            webhook_path=env.get("WEBHOOK_PATH", "/webhook"),
+            webhook_secret=env.get("WEBHOOK_SECRET", ""),
+            webhook_host=env.get("WEBHOOK_HOST", "0.0.0.0"),
+            webhook_port=int(env.get("WEBHOOK_PORT", "8080")),
+            webhook_workers=int(env.get("WEBHOOK_WORKERS", "16")),
+            webhook_queue_size=int(env.get("WEBHOOK_QUEUE_SIZE", "1000")),
+            stream_shards=int(env.get("STREAM_SHARDS", "0")),
+            stream_maxlen=int(env.get("STREAM_MAXLEN", "1000000")),
+            log_format=env.get("LOG_FORMAT", "text"),
+            log_sample_burst=int(env.get("LOG_SAMPLE_BURST", "10")),
+            log_sample_window=float(env.get("LOG_SAMPLE_WINDOW", "60")),
+            metrics_host=env.get("METRICS_HOST", "0.0.0.0"),
+            metrics_port=int(env.get("METRICS_PORT", "9100")),
+            slow_updates_size=int(env.get("SLOW_UPDATES_SIZE", "20")),
+            profile_sample_rate=float(env.get("PROFILE_SAMPLE_RATE", "0")),
+            archive_path=env.get("ARCHIVE_PATH", "events_archive.sqlite3"),
+            archive_owner=env.get("ARCHIVE_OWNER", ""),
+            archive_rejected_days=int(env.get("ARCHIVE_REJECTED_DAYS", "30")),
+            archive_batch_size=int(env.get("ARCHIVE_BATCH_SIZE", "500")),
+            archive_interval=int(env.get("ARCHIVE_INTERVAL", "3600")),
+        )
+
     @property
     def redis_url(self):
-        return f"redis://{os.getenv('REDIS_HOST', 'localhost')}:{os.getenv('REDIS_PORT', '6379')}/0"
+        return f"redis://{self.redis_host}:{self.redis_port}/{self.redis_db}"
 
-    @property
-    def admin_ids(self):
-        raw_ids = os.getenv("ADMIN_IDS", "7724035951").split('#')[0].strip()
-        return [int(i.strip()) for i in raw_ids.split(',') if i.strip().isdigit()]
-    
-    @property
-    def channel_id(self):
-        return int(os.getenv("CHANNEL_ID", "-1002629002336"))
-    
-    @property
-    def redis_host(self):
-        return os.getenv("REDS_HOST", "localhost")
-    
-    @property
-    def redis_port(self):
-        return int(os.getenv("REDIS_PORT", "6379"))
-    
-    @property
-    def redis_db(self):
-        return int(os.getenv("REDIS_DB", "0"))
-    
-    @property
-    def celery_broker_url(self):
-        return os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
-    
-    @property
-    def celery_result_backend(self):
-        return os.getenv("CELERY_RESULT_BACKEND", "redis://localhost:6379/0")
+class CurrentConfig:
+    """Ссылка на текущий снимок Config.
+
+    Все `from config import config` получают этот объект, а атрибуты
+    читаются из снимка, на который он указывает. Перезагрузка собирает
+    новый снимок целиком и подменяет ссылку одним присваиванием, так что
+    частично обновлённых настроек никто не видит. Кому нужны согласованные
+    значения нескольких полей, берёт snapshot() один раз.
+    """
+    __slots__ = ("current",)
+
+    def __init__(self, snapshot):
+        self.current = snapshot
+
+    def __getattr__(self, name):
+        return getattr(self.current, name)
+
+    def snapshot(self):
+        return self.current
+
+    def reload(self):
+        """Перечитывание .env и окружения.
+
+        Приоритет тот же, что при запуске: переменная окружения процесса
+        перекрывает .env; os.environ при этом не меняется. При ошибке
+        разбора (ValueError) остаётся прежний снимок. Пулы и лимитеры,
+        созданные при импорте, параметры соединений не меняют — для них
+        нужен перезапуск.
+        """
+        env = {key: value for key, value in dotenv_values().items() if value is not None}
+        env.update((key, value) for key, value in os.environ.items() if key not in _DOTENV_ONLY)
+        self.current = Config.from_env(env)
 
-config = Config()
+config = CurrentConfig(Config.from_env())
@@ -1,30 +1,578 @@
-import redis
+import asyncio
+import logging
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from redis import asyncio as redis
+from redis.exceptions import NoScriptError
 from config import config
+from utils import render_cache
+from metrics import InstrumentedRedis
+import media
+import search
+from archive import EventArchive
+
+logger = logging.getLogger(__name__)
+
+# Общий пул соединений: его же использует RedisStorage в main.py.
+# Блокирующий: при всплеске апдейтов команды ждут свободное соединение,
+# а не падают с MaxConnectionsError
+redis_pool = redis.BlockingConnectionPool.from_url(
+    config.redis_url, decode_responses=True, max_connections=config.redis_max_connections
+)
+
+# Индексы пользователей по времени: score = unix timestamp
+USER_INDEXES = {"last_active": "users:last_active", "last_notified": "users:last_notified"}
+
+# Статусы мероприятий — sorted set'ы, score = время попадания в статус
+STATUS_SETS = ("pending_events", "published_events", "rejected_events")
+
+# Итоги архивации: сколько мероприятий и байт памяти Redis освобождено
+ARCHIVE_TOTALS = "archive:totals"
+# Хост, на диске которого лежит файл архива: SQLite у каждой реплики свой,
+# поэтому архивирует и читает архив только эта реплика
+ARCHIVE_OWNER = "archive:owner"
+HOSTNAME = socket.gethostname()
+# Сколько интервалов архивации владелец может пропустить, прежде чем
+# остальные реплики сочтут, что он пропал (например, сменил имя хоста)
+ARCHIVE_STALE_RUNS = 3
+
+# Кэш результатов поиска: страницы читаются из готового пересечения
+SEARCH_TTL = 120
+
+# Выбор мероприятий администратором для массовых действий живёт сутки
+SELECTION_TTL = 24 * 3600
+
+# Переход между статусами: только если мероприятие ещё в исходном статусе
+MOVE_EVENT_SCRIPT = """
+if redis.call('ZREM', KEYS[1], ARGV[1]) == 0 then return 0 end
+redis.call('ZADD', KEYS[2], ARGV[2], ARGV[1])
+return 1
+"""
+
+# Аренды с владельцем: продление и снятие только своей, 0 — аренда уже чужая
+RENEW_LEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then return 0 end
+return redis.call('EXPIRE', KEYS[1], ARGV[2])
+"""
+RELEASE_LEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then return 0 end
+return redis.call('DEL', KEYS[1])
+"""
+
+def _clean(data):
+    """Redis не хранит None — такие поля просто пропускаем"""
+    return {k: v for k, v in data.items() if v is not None}
+
+def _timestamp(value):
+    return datetime.fromisoformat(value).timestamp()
 
 class Database:
-    def __init__(self):
-        self.redis = redis.StrictRedis(
-            host=config.redis_host,  # Используем свойство вместо атрибута
-            port=config.redis_port,
-            db=config.redis_db,
-            decode_responses=True
+    def __init__(self, pool=redis_pool, archive_path=config.archive_path):
+        self.redis = InstrumentedRedis(connection_pool=pool)
+        self.archive = EventArchive(archive_path)
+        self._archive_owner = None
+        self.pending_listeners = []
+        self._move_event = self.redis.register_script(MOVE_EVENT_SCRIPT)
+        self._renew_lease = self.redis.register_script(RENEW_LEASE_SCRIPT)
+        self._release_lease = self.redis.register_script(RELEASE_LEASE_SCRIPT)
+
+    def on_leave_pending(self, listener):
+        """Подписка на уход мероприятий из очереди модерации: await listener(event_ids).
+
+        Так модули над Database (индекс повторов) чистят свои записи,
+        не завися от того, каким путём мероприятие покинуло очередь.
+        """
+        self.pending_listeners.append(listener)
+
+    async def _left_pending(self, event_ids):
+        if event_ids:
+            for listener in self.pending_listeners:
+                await listener(event_ids)
+
+    async def renew_lease(self, key, owner, seconds):
+        """Продление аренды владельцем; False, если её уже держит другой"""
+        return bool(await self._renew_lease(keys=[key], args=[owner, seconds]))
+
+    async def release_lease(self, key, owner):
+        await self._release_lease(keys=[key], args=[owner])
+
+    async def save_event(self, event_data):
+        """Сохранение нового мероприятия в очередь модерации; возвращает его id.
+
+        Id выдаётся заранее через INCR; хеш, очередь и индексы поиска
+        пишутся одной транзакцией.
+        """
+        event_id = await self.redis.incr("event:next_id")
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(f"event:{event_id}", mapping=_clean(event_data))
+            pipe.zadd("pending_events", {event_id: time.time()})
+            search.add_to_index(pipe, event_id, event_data)
+            await pipe.execute()
+        return event_id
+
+    async def script_with_index(self, script, keys, args, event_id, event):
+        """Скрипт и индексация мероприятия одной транзакцией; результат скрипта.
+
+        EVALSHA ставится в MULTI напрямую: script(client=pipe) перед каждой
+        транзакцией проверял бы скрипт лишним SCRIPT EXISTS. Если Redis
+        скрипта не знает (перезапуск), он загружается и транзакция
+        повторяется: индексация идемпотентна.
+        """
+        for attempt in range(2):
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.evalsha(script.sha, len(keys), *keys, *args)
+                search.add_to_index(pipe, event_id, event)
+                try:
+                    return (await pipe.execute())[0]
+                except NoScriptError:
+                    if attempt:
+                        raise
+            await self.redis.script_load(script.script)
+
+    async def get_event(self, event_id):
+        event = await self.redis.hgetall(f"event:{event_id}")
+        if not event and await self.owns_archive():
+            # Завершённые мероприятия читаются из архива
+            record = await asyncio.to_thread(self.archive.get, event_id)
+            event = record["event"] if record else {}
+        return event
+
+    async def get_events(self, event_ids):
+        """Пакетное чтение мероприятий за один round trip"""
+        if not event_ids:
+            return []
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for event_id in event_ids:
+                pipe.hgetall(f"event:{event_id}")
+            events = await pipe.execute()
+        return [dict(event, id=event_id) for event_id, event in zip(event_ids, events) if event]
+
+    async def update_event(self, event_id, event_data):
+        """Запись изменений с повышением ревизии; возвращает новую ревизию.
+
+        Поля со значением None удаляются из хеша.
+        """
+        removed = [k for k, v in event_data.items() if v is None]
+        event_data = {k: v for k, v in _clean(event_data).items() if k not in ("id", "rev")}
+        # Прежние значения нужны, чтобы убрать устаревшие записи индексов
+        old = dict(zip(search.INDEXED_FIELDS, await self.redis.hmget(f"event:{event_id}", search.INDEXED_FIELDS)))
+        new = {k: v for k, v in {**old, **event_data}.items() if k not in removed}
+        async with self.redis.pipeline(transaction=True) as pipe:
+            search.remove_from_index(pipe, event_id, old)
+            search.add_to_index(pipe, event_id, new)
+            if removed:
+                pipe.hdel(f"event:{event_id}", *removed)
+            if event_data:
+                pipe.hset(f"event:{event_id}", mapping=event_data)
+            pipe.hincrby(f"event:{event_id}", "rev", 1)
+            rev = (await pipe.execute())[-1]
+        render_cache.invalidate(event_id)
+        return rev
+
+    async def get_media(self, event_id):
+        """Записи реестра медиа мероприятия (альбом) в порядке отправки"""
+        return [media.loads(raw) for raw in await self.redis.lrange(f"media:{event_id}", 0, -1)]
+
+    async def set_media(self, event_id, entries):
+        """Замена альбома; хранится только для нескольких фото"""
+        key = f"media:{event_id}"
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(key)
+            if len(entries) > 1:
+                pipe.rpush(key, *(media.dumps(item) for item in entries))
+            await pipe.execute()
+
+    async def move_event(self, event_id, from_set, to_set, score=None):
+        """Атомарная смена статуса; False, если мероприятия уже нет в from_set"""
+        moved = await self._move_event(
+            keys=[from_set, to_set],
+            args=[event_id, time.time() if score is None else score]
         )
+        if moved and from_set == "pending_events":
+            await self._left_pending([event_id])
+        return bool(moved)
+
+    async def move_events(self, event_ids, from_set, to_set, score=None):
+        """Пакетная смена статуса за один round trip; список перенесённых id"""
+        if not event_ids:
+            return []
+        score = time.time() if score is None else score
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for event_id in event_ids:
+                await self._move_event(keys=[from_set, to_set], args=[event_id, score], client=pipe)
+            moved = await pipe.execute()
+        moved = [event_id for event_id, ok in zip(event_ids, moved) if ok]
+        if from_set == "pending_events":
+            await self._left_pending(moved)
+        return moved
+
+    async def toggle_selected(self, admin_id, event_id):
+        """Отметка мероприятия для массовых действий; True, если теперь выбрано"""
+        key = f"selection:{admin_id}"
+        if await self.redis.srem(key, event_id):
+            return False
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.sadd(key, event_id)
+            pipe.expire(key, SELECTION_TTL)
+            await pipe.execute()
+        return True
+
+    async def get_selection(self, admin_id):
+        return await self.redis.smembers(f"selection:{admin_id}")
+
+    async def take_selection(self, admin_id):
+        """Выбранные мероприятия с очисткой выбора: повторное нажатие ничего не сделает"""
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.smembers(f"selection:{admin_id}")
+            pipe.delete(f"selection:{admin_id}")
+            selected, _ = await pipe.execute()
+        return sorted(selected, key=int)
+
+    async def get_events_page(self, status_set, cursor=None, limit=10):
+        """Страница мероприятий в порядке поступления.
+
+        cursor — (score, id) последнего элемента предыдущей страницы; возвращает
+        (мероприятия, курсор следующей страницы или None). Одинаковые score
+        Redis упорядочивает по id как по строке, поэтому курсор включает
+        score, а уже показанные элементы с тем же score пропускаются.
+        """
+        entries = []
+        if cursor is None:
+            entries = await self.redis.zrangebyscore(
+                status_set, "-inf", "+inf", start=0, num=limit + 1, withscores=True
+            )
+        else:
+            score, member = cursor[0], str(cursor[1])
+            offset = 0
+            while len(entries) <= limit:
+                batch = await self.redis.zrangebyscore(
+                    status_set, score, "+inf", start=offset, num=limit + 1, withscores=True
+                )
+                offset += len(batch)
+                entries.extend(
+                    (event_id, value) for event_id, value in batch
+                    if value != score or event_id > member
+                )
+                if len(batch) <= limit:
+                    break
+        next_cursor = None
+        if len(entries) > limit:
+            last_id, last_score = entries[limit - 1]
+            next_cursor = (last_score, int(last_id))
+        events = await self.get_events([event_id for event_id, _ in entries[:limit]])
+        return events, next_cursor
+
+    async def get_pending_events(self, cursor=None, limit=10):
+        return await self.get_events_page("pending_events", cursor, limit)
+
+    async def search_events(self, query, offset=0, limit=10):
+        """Поиск по индексам: (мероприятия по дате начала, всего найдено).
+
+        Пересечение считает Redis (ZINTERSTORE начинает с самого маленького
+        множества); диапазоны даты и цены сначала вырезаются ZRANGESTORE.
+        Результат кэшируется на SEARCH_TTL, листание — только ZRANGE.
+        """
+        result = query.result_key
+        if not await self.redis.expire(result, SEARCH_TTL):
+            await self._build_search(query, result)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.zrange(result, offset, offset + limit - 1)
+            pipe.zcard(result)
+            event_ids, total = await pipe.execute()
+        return await self.get_events(event_ids), total
+
+    async def _build_search(self, query, result):
+        temporary = []
+        # Вес 1 только у даты: score результата — время начала, по нему сортировка
+        weights = {}
+
+        def ranged(index, low, high):
+            if low is None and high is None:
+                return index
+            key = f"{result}:{index}"
+            pipe.zrangestore(
+                key, index,
+                "-inf" if low is None else low,
+                "+inf" if high is None else high,
+                byscore=True
+            )
+            temporary.append(key)
+            return key
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            # Верхняя граница даты не включается: диапазон дней — [начало, конец)
+            date_to = None if query.date_to is None else f"({query.date_to}"
+            weights[ranged(search.DATE_INDEX, query.date_from, date_to)] = 1
+            if query.price_min is not None or query.price_max is not None:
+                weights[ranged(search.PRICE_INDEX, query.price_min, query.price_max)] = 0
+            for token in query.tokens:
+                weights[search.token_key(token)] = 0
+            if query.status_set:
+                weights[query.status_set] = 0
+            if query.organizer_id is not None:
+                weights[search.organizer_key(query.organizer_id)] = 0
+            pipe.zinterstore(result, weights)
+            pipe.expire(result, SEARCH_TTL)
+            if temporary:
+                pipe.delete(*temporary)
+            await pipe.execute()
+
+    async def migrate_search_index(self, chunk_size=500):
+        """Однократная индексация уже существующих мероприятий.
+
+        Флаг ставится после полного прохода, как в migrate_user_indexes.
+        """
+        if await self.redis.exists("idx:built"):
+            return
+        cursor = 0
+        while True:
+            cursor, keys = await self.redis.scan(cursor, match="event:*", count=chunk_size)
+            keys = [key for key in keys if key.split(":", 1)[1].isdigit()]
+            if keys:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for key in keys:
+                        pipe.hmget(key, search.INDEXED_FIELDS)
+                    rows = await pipe.execute()
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for key, values in zip(keys, rows):
+                        search.add_to_index(pipe, key.split(":", 1)[1], dict(zip(search.INDEXED_FIELDS, values)))
+                    await pipe.execute()
+            if cursor == 0:
+                break
+        await self.redis.set("idx:built", "1")
+
+    async def count_events(self, status_set):
+        return await self.redis.zcard(status_set)
+
+    async def migrate_status_sets(self):
+        """Однократный перевод старых SET-статусов в sorted set'ы"""
+        for key in STATUS_SETS:
+            if await self.redis.type(key) != "set":
+                continue
+            members = sorted(await self.redis.smembers(key), key=int)
+            # Разные score в порядке id: совпадающие score плохо листаются
+            start = time.time() - len(members) / 1000
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.delete(key)
+                if members:
+                    pipe.zadd(key, {event_id: start + index / 1000 for index, event_id in enumerate(members)})
+                await pipe.execute()
+
+    async def save_user(self, user_id, user_data):
+        user_data = _clean(user_data)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(f"user:{user_id}", mapping=user_data)
+            for field, index in USER_INDEXES.items():
+                if field in user_data:
+                    pipe.zadd(index, {user_id: _timestamp(user_data[field])})
+            await pipe.execute()
+
+    async def update_user(self, user_id, user_data):
+        await self.save_user(user_id, user_data)
+
+    async def iter_inactive_organizers(self, days, chunk_size=500):
+        """Пачки id пользователей, неактивных и не уведомлённых за days дней.
+
+        Выборка считается на стороне Redis одним пайплайном во временный
+        sorted set, клиент читает его по рангу пачками.
+        """
+        cutoff = (datetime.now() - timedelta(days=days)).timestamp()
+        result = f"tmp:inactive:{uuid.uuid4().hex}"
+        idle, notified = f"{result}:idle", f"{result}:notified"
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.zrangestore(idle, USER_INDEXES["last_active"], "-inf", f"({cutoff}", byscore=True)
+            pipe.zrangestore(notified, USER_INDEXES["last_notified"], cutoff, "+inf", byscore=True)
+            pipe.zdiffstore(result, [idle, notified])
+            pipe.delete(idle, notified)
+            pipe.expire(result, 600)
+            await pipe.execute()
+        try:
+            start = 0
+            while True:
+                chunk = await self.redis.zrange(result, start, start + chunk_size - 1)
+                if not chunk:
+                    return
+                yield chunk
+                start += chunk_size
+        finally:
+            await self.redis.delete(result)
+
+    async def mark_notified(self, user_ids, notified_at):
+        """Пакетная запись last_notified за один round trip"""
+        if not user_ids:
+            return
+        score = _timestamp(notified_at)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.hset(f"user:{user_id}", "last_notified", notified_at)
+            pipe.zadd(USER_INDEXES["last_notified"], {user_id: score for user_id in user_ids})
+            await pipe.execute()
+
+    async def migrate_user_indexes(self, chunk_size=500):
+        """Однократное построение индексов для уже существующих пользователей.
+
+        Флаг ставится только после полного прохода: прерванная миграция
+        повторится при следующем запуске. ZADD идемпотентен, поэтому
+        одновременный проход нескольких реплик безопасен.
+        """
+        if await self.redis.exists("users:indexed"):
+            return
+        cursor = 0
+        while True:
+            cursor, keys = await self.redis.scan(cursor, match="user:*", count=chunk_size)
+            if keys:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for key in keys:
+                        pipe.hmget(key, *USER_INDEXES)
+                    rows = await pipe.execute()
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for key, values in zip(keys, rows):
+                        user_id = key.split(":", 1)[1]
+                        for value, index in zip(values, USER_INDEXES.values()):
+                            if value:
+                                pipe.zadd(index, {user_id: _timestamp(value)})
+                    await pipe.execute()
+            if cursor == 0:
+                break
+        await self.redis.set("users:indexed", "1")
+
+    async def archive_owner(self, claim=False):
+        """Хост с файлом архива или None, пока архивации не было.
+
+        ARCHIVE_OWNER задаёт его явно; иначе архив закрепляется за первой
+        репликой, начавшей архивацию (claim=True), и больше не переезжает.
+        """
+        if config.archive_owner:
+            return config.archive_owner
+        if self._archive_owner is None:
+            if claim:
+                await self.redis.set(ARCHIVE_OWNER, HOSTNAME, nx=True)
+            self._archive_owner = await self.redis.get(ARCHIVE_OWNER)
+        return self._archive_owner
+
+    async def owns_archive(self, claim=False):
+        return await self.archive_owner(claim) == HOSTNAME
+
+    async def check_archive_owner(self):
+        """Ошибка в лог, если владелец архива давно не архивировал.
+
+        Владелец закреплён по имени хоста, и после передеплоя с новым именем
+        архивацию не выполняет никто. Сам владелец отмечает каждый проход
+        в archive:totals, остальные реплики проверяют эту отметку.
+        """
+        last_run = await self.redis.hget(ARCHIVE_TOTALS, "last_run")
+        if last_run is None or time.time() - float(last_run) < ARCHIVE_STALE_RUNS * config.archive_interval:
+            return
+        logger.error(
+            f"Archive owner {await self.archive_owner()!r} has not archived since "
+            f"{datetime.fromtimestamp(float(last_run)).isoformat()}, this host is {HOSTNAME!r}: "
+            f"set ARCHIVE_OWNER to a stable host name or delete {ARCHIVE_OWNER} and restart"
+        )
+
+    async def archive_finished(self, batch_size=None):
+        """Перенос завершённых мероприятий из Redis в архив; отчёт о проходе.
+
+        Прошедшие опубликованные и давно отклонённые мероприятия пишутся
+        в SQLite сегментами по batch_size, после чего их хеши, альбомы и
+        записи индексов удаляются. Освобождённая память считается по
+        MEMORY USAGE до удаления. На репликах, которым архив не принадлежит,
+        ничего не делает.
+        """
+        report = {"archived": 0, "reclaimed_bytes": 0}
+        if not await self.owns_archive(claim=True):
+            return report
+        batch_size = batch_size or config.archive_batch_size
+        now = time.time()
+        rejected_before = now - config.archive_rejected_days * 86400
+        while True:
+            batch = await self._archive_candidates(now, rejected_before, batch_size)
+            if not batch:
+                break
+            archived, reclaimed = await self._archive_batch(batch)
+            report["archived"] += archived
+            report["reclaimed_bytes"] += reclaimed
+            if not archived:
+                break
+        async with self.redis.pipeline(transaction=False) as pipe:
+            # Отметка прохода: по ней другие реплики замечают пропавшего владельца
+            pipe.hset(ARCHIVE_TOTALS, "last_run", now)
+            if report["archived"]:
+                pipe.hincrby(ARCHIVE_TOTALS, "events", report["archived"])
+                pipe.hincrby(ARCHIVE_TOTALS, "reclaimed_bytes", report["reclaimed_bytes"])
+            await pipe.execute()
+        if report["archived"]:
+            logger.info(f"Archived {report['archived']} events, reclaimed {report['reclaimed_bytes']} bytes")
+        return report
+
+    async def _archive_candidates(self, now, rejected_before, limit):
+        """[(id, статус)]: опубликованные с прошедшей датой и старые отклонённые"""
+        past = f"tmp:archive:{uuid.uuid4().hex}"
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.zrangestore(past, search.DATE_INDEX, "-inf", now, byscore=True)
+            pipe.zinterstore(past, {past: 1, "published_events": 0})
+            pipe.zrange(past, 0, limit - 1)
+            pipe.delete(past)
+            pipe.zrangebyscore("rejected_events", "-inf", rejected_before, start=0, num=limit)
+            *_, published, _, rejected = await pipe.execute()
+        batch = [(event_id, "published_events") for event_id in published]
+        batch += [(event_id, "rejected_events") for event_id in rejected]
+        return batch[:limit]
+
+    async def _archive_batch(self, batch):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for event_id, _ in batch:
+                pipe.hgetall(f"event:{event_id}")
+                pipe.lrange(f"media:{event_id}", 0, -1)
+                pipe.memory_usage(f"event:{event_id}")
+                pipe.memory_usage(f"media:{event_id}")
+            rows = await pipe.execute()
 
-    def save_event(self, event_id, event_data):
-        self.redis.hset(f"event:{event_id}", mapping=event_data)
-        self.redis.sadd("pending_events", event_id)
+        records = {}
+        reclaimed = 0
+        for index, (event_id, status) in enumerate(batch):
+            event, album, event_bytes, media_bytes = rows[index * 4:index * 4 + 4]
+            records[str(event_id)] = {
+                "status": status,
+                "event": event,
+                "media": [media.loads(raw) for raw in album],
+            }
+            reclaimed += (event_bytes or 0) + (media_bytes or 0)
 
-    def get_event(self, event_id):
-        return self.redis.hgetall(f"event:{event_id}")
+        # Сначала запись в архив: при сбое мероприятие останется и в Redis, но не потеряется
+        await asyncio.to_thread(self.archive.write, records)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            for event_id, status in batch:
+                pipe.zrem(status, event_id)
+                pipe.delete(f"event:{event_id}", f"media:{event_id}")
+                search.remove_from_index(pipe, event_id, records[str(event_id)]["event"])
+            await pipe.execute()
+        for event_id, _ in batch:
+            render_cache.invalidate(event_id)
+        # Записи, оставшиеся с тех пор, когда уход из очереди их не чистил
+        await self._left_pending([event_id for event_id, _ in batch])
+        return len(records), reclaimed
 
-    def move_event(self, event_id, from_set, to_set):
-        self.redis.srem(from_set, event_id)
-        self.redis.sadd(to_set, event_id)
+    async def archive_report(self):
+        """Итоги архивации для администраторов и /metrics.
 
-    def get_pending_events(self):
-        return [self.get_event(eid) for eid in self.redis.smembers("pending_events")]
+        Статистика файла (archive) есть только у реплики-владельца, на
+        остальных — None.
+        """
+        totals = await self.redis.hgetall(ARCHIVE_TOTALS)
+        owner = await self.archive_owner()
+        stats = await asyncio.to_thread(self.archive.stats) if owner == HOSTNAME else None
+        return {
+            "archived_events": int(totals.get("events", 0)),
+            "reclaimed_bytes": int(totals.get("reclaimed_bytes", 0)),
+            "owner": owner,
+            "archive": stats,
+        }
 
-    def save_user(self, user_id, user_data):
-        self.redis.hset(f"user:{user_id}", mapping=user_data)
+    async def close(self):
+        await self.redis.aclose()
+        await asyncio.to_thread(self.archive.close)
 
-db = Database()
\ No newline at end of file
+db = Database()
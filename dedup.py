@@ -0,0 +1,168 @@
+import hashlib
+import logging
+import re
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+# Отпечатки мероприятий на модерации:
+#   dup:exact:{sha1}      — id по нормализованным названию, дате и адресу
+#   dup:lsh:{полоса}:{hex} — SET id с совпадающей 16-битной полосой SimHash описания
+#   dup:simhash           — HASH id -> "дата|simhash" для проверки кандидатов
+#   dup:exact_of          — HASH id -> ключ dup:exact:*, чтобы удалить его при уходе
+# Всё удаляется, когда мероприятие покидает очередь модерации
+EXACT_TTL = 90 * 24 * 3600
+SIMHASH = "dup:simhash"
+EXACT_OF = "dup:exact_of"
+
+# Точный отпечаток удаляется, только если он всё ещё указывает на это мероприятие.
+# KEYS — ключи dup:exact:*, ARGV — соответствующие id
+FORGET_EXACT_SCRIPT = """
+for i, key in ipairs(KEYS) do
+    if redis.call('GET', key) == ARGV[i] then redis.call('DEL', key) end
+end
+return #KEYS
+"""
+BANDS = 4
+BAND_BITS = 64 // BANDS
+# При расстоянии Хэмминга <= 3 из 4 полос хотя бы одна совпадёт целиком
+MAX_DISTANCE = 3
+
+WORD_RE = re.compile(r"\w+")
+
+def normalize(text):
+    return " ".join(WORD_RE.findall((text or "").lower().replace("ё", "е")))
+
+def exact_key(event):
+    raw = "|".join(normalize(event.get(field)) for field in ("title", "date_obj", "address"))
+    return f"dup:exact:{hashlib.sha1(raw.encode()).hexdigest()}"
+
+def simhash(text):
+    """64-битный SimHash по словам; 0 для пустого текста.
+
+    Описания короткие, поэтому признаки — отдельные слова: по парам слов
+    правка двух слов уже даёт расстояние больше порога.
+    """
+    weights = [0] * 64
+    for word in normalize(text).split():
+        value = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+def band_keys(value):
+    mask = (1 << BAND_BITS) - 1
+    return [f"dup:lsh:{band}:{value >> (band * BAND_BITS) & mask:04x}" for band in range(BANDS)]
+
+class DuplicateIndex:
+    """Поиск повторных заявок до рассылки администраторам.
+
+    Точный отпечаток ловит повтор с теми же названием, датой и адресом,
+    LSH по SimHash описания — переписанный текст на ту же дату. Проверка —
+    два round trip'а независимо от размера очереди. Записи мероприятий,
+    покинувших модерацию, удаляются подпиской на уход из очереди.
+    """
+    def __init__(self, database=db):
+        self.db = database
+        self.forget_exact = database.redis.register_script(FORGET_EXACT_SCRIPT)
+        database.on_leave_pending(self.forget_events)
+
+    async def find(self, event):
+        """id мероприятия на модерации, повтором которого является event, или None"""
+        signature = simhash(event.get('description'))
+        bands = band_keys(signature) if signature else []
+        async with self.db.redis.pipeline(transaction=False) as pipe:
+            pipe.get(exact_key(event))
+            for key in bands:
+                pipe.smembers(key)
+            exact, *members = await pipe.execute()
+
+        candidates = sorted(set().union(*members) if members else set(), key=int)
+        if exact and exact not in candidates:
+            candidates.insert(0, exact)
+        if not candidates:
+            return None
+
+        async with self.db.redis.pipeline(transaction=False) as pipe:
+            pipe.hmget(SIMHASH, candidates)
+            for event_id in candidates:
+                pipe.zscore("pending_events", event_id)
+            signatures, *scores = await pipe.execute()
+
+        stale = [event_id for event_id, score in zip(candidates, scores) if score is None]
+        if stale:
+            await self.forget_events(stale)
+        if exact and exact not in stale:
+            return exact
+        for event_id, stored, score in zip(candidates, signatures, scores):
+            if score is None or not stored:
+                continue
+            date, _, other = stored.rpartition("|")
+            if date == (event.get('date_obj') or "") and bin(signature ^ int(other)).count("1") <= MAX_DISTANCE:
+                return event_id
+        return None
+
+    async def add(self, event_id, event):
+        """Регистрация нового мероприятия на модерации"""
+        signature = simhash(event.get('description'))
+        exact = exact_key(event)
+        async with self.db.redis.pipeline(transaction=False) as pipe:
+            pipe.set(exact, event_id, ex=EXACT_TTL)
+            pipe.hset(EXACT_OF, event_id, exact)
+            if signature:
+                pipe.hset(SIMHASH, event_id, f"{event.get('date_obj') or ''}|{signature}")
+                for key in band_keys(signature):
+                    pipe.sadd(key, event_id)
+            await pipe.execute()
+
+    async def merge(self, event_id, event, entries):
+        """Повтор сливается с мероприятием на модерации.
+
+        Повтор от того же организатора обновляет поля (обычно это
+        исправление), от другого — только увеличивает счётчик повторов.
+        Возвращает True, если мероприятие обновлено.
+        """
+        existing = await self.db.get_event(event_id)
+        duplicates = int(existing.get('duplicates') or 0) + 1
+        # Счётчик тоже идёт через update_event: ревизия и кэш карточки обновляются
+        if str(existing.get('organizer_id')) != str(event.get('organizer_id')):
+            await self.db.update_event(event_id, {'duplicates': duplicates})
+            return False
+        fields = {k: v for k, v in event.items() if v is not None}
+        fields['duplicates'] = duplicates
+        await self.db.update_event(event_id, fields)
+        if entries:
+            await self.db.set_media(event_id, entries)
+        # Отпечатки прежней версии заменяются новыми
+        await self.forget_events([event_id])
+        await self.add(event_id, {**existing, **fields})
+        logger.info(f"Duplicate submission merged into event {event_id}")
+        return True
+
+    async def forget_events(self, event_ids):
+        """Удаление всех отпечатков мероприятий: полос LSH, SimHash и точного"""
+        event_ids = [str(event_id) for event_id in event_ids]
+        async with self.db.redis.pipeline(transaction=False) as pipe:
+            pipe.hmget(SIMHASH, event_ids)
+            pipe.hmget(EXACT_OF, event_ids)
+            signatures, exact_keys = await pipe.execute()
+
+        bands = {}
+        for event_id, stored in zip(event_ids, signatures):
+            if stored:
+                for key in band_keys(int(stored.rpartition("|")[2])):
+                    bands.setdefault(key, []).append(event_id)
+        exact = [(key, event_id) for event_id, key in zip(event_ids, exact_keys) if key]
+        async with self.db.redis.pipeline(transaction=False) as pipe:
+            pipe.hdel(SIMHASH, *event_ids)
+            pipe.hdel(EXACT_OF, *event_ids)
+            for key, members in bands.items():
+                pipe.srem(key, *members)
+            if exact:
+                await self.forget_exact(
+                    keys=[key for key, _ in exact], args=[event_id for _, event_id in exact], client=pipe
+                )
+            await pipe.execute()
+
+duplicates = DuplicateIndex()
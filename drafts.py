@@ -0,0 +1,136 @@
+import time
+
+from database import db
+import media
+import search
+
+DRAFT_TTL = 7 * 24 * 3600
+# Метка последнего пришедшего фото альбома нужна только на время сборки
+ALBUM_TTL = 60
+
+# Черновик становится мероприятием целиком на стороне Redis:
+# переименование хеша и альбома и постановка в очередь модерации одним шагом.
+# Id выдаётся заранее через INCR, все ключи скрипта объявлены в KEYS:
+#   1 — черновик, 2 — event:{id}, 3 — pending_events, 4 — альбом черновика, 5 — media:{id}
+PROMOTE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then return false end
+redis.call('RENAME', KEYS[1], KEYS[2])
+redis.call('PERSIST', KEYS[2])
+if #ARGV > 2 then redis.call('HSET', KEYS[2], unpack(ARGV, 3)) end
+redis.call('ZADD', KEYS[3], ARGV[1], ARGV[2])
+if redis.call('EXISTS', KEYS[4]) == 1 then
+    redis.call('RENAME', KEYS[4], KEYS[5])
+    redis.call('PERSIST', KEYS[5])
+end
+return redis.call('HGETALL', KEYS[2])
+"""
+
+# Шаг мастера дописывает поле, только если черновик ещё жив: состояние FSM
+# переживает TTL черновика, и HSET создал бы неполный черновик без организатора
+SET_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then return 0 end
+redis.call('HSET', KEYS[1], unpack(ARGV, 2))
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return 1
+"""
+
+def _draft_key(user_id):
+    return f"draft:{user_id}"
+
+def _media_key(user_id):
+    return f"draft:{user_id}:media"
+
+def _album_key(user_id):
+    return f"draft:{user_id}:album"
+
+class DraftStore:
+    """Черновики мастера создания мероприятия: по одному полю за шаг"""
+    def __init__(self, database=db):
+        self.db = database
+        self.set_script = database.redis.register_script(SET_SCRIPT)
+        self.promote_script = database.redis.register_script(PROMOTE_SCRIPT)
+
+    async def start(self, user_id, fields):
+        """Новый черновик вместо старого"""
+        key = _draft_key(user_id)
+        async with self.db.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(key, _media_key(user_id))
+            pipe.hset(key, mapping=fields)
+            pipe.expire(key, DRAFT_TTL)
+            await pipe.execute()
+
+    async def set(self, user_id, **fields):
+        """Запись только изменившихся полей; False, если черновика уже нет"""
+        args = [DRAFT_TTL]
+        for field, value in fields.items():
+            if value is not None:
+                args += [field, value]
+        if len(args) == 1:
+            return await self.db.redis.exists(_draft_key(user_id)) == 1
+        return await self.set_script(keys=[_draft_key(user_id)], args=args) == 1
+
+    async def get(self, user_id):
+        return await self.db.redis.hgetall(_draft_key(user_id))
+
+    async def discard(self, user_id):
+        await self.db.redis.delete(_draft_key(user_id), _media_key(user_id))
+
+    async def add_caption(self, user_id, caption):
+        """Подпись к фото дописывается к описанию черновика"""
+        description = await self.db.redis.hget(_draft_key(user_id), "description")
+        if description is None:
+            return
+        await self.set(user_id, description=f"{description}\n\n{caption}" if description else caption)
+
+    async def add_media(self, user_id, item, token):
+        """Фото альбома в черновик; число фото в нём или 0, если черновика уже нет.
+
+        token (message_id) запоминается как последнее пришедшее фото:
+        альбом завершает обработчик того фото, после которого новых не было.
+        """
+        if not await self.db.redis.exists(_draft_key(user_id)):
+            return 0
+        key = _media_key(user_id)
+        async with self.db.redis.pipeline(transaction=False) as pipe:
+            pipe.rpush(key, media.dumps(item))
+            pipe.expire(key, DRAFT_TTL)
+            pipe.set(_album_key(user_id), token, ex=ALBUM_TTL)
+            count, _, _ = await pipe.execute()
+        return count
+
+    async def is_last_media(self, user_id, token):
+        return await self.db.redis.get(_album_key(user_id)) == str(token)
+
+    async def get_media(self, user_id):
+        return [media.loads(raw) for raw in await self.db.redis.lrange(_media_key(user_id), 0, -1)]
+
+    async def promote(self, user_id, draft, **fields):
+        """Перевод черновика в очередь модерации; (id, мероприятие) или None.
+
+        draft — черновик, уже прочитанный вызывающим (get): по нему
+        мероприятие индексируется в одной транзакции с переводом. Если
+        черновика уже нет, выданный id просто пропускается.
+        """
+        if not draft:
+            return None
+        event_id = await self.db.redis.incr("event:next_id")
+        args = [time.time(), event_id]
+        indexed = dict(draft)
+        for field, value in fields.items():
+            if value is not None:
+                args += [field, value]
+                indexed[field] = value
+        flat = await self.db.script_with_index(
+            self.promote_script,
+            [_draft_key(user_id), f"event:{event_id}", "pending_events", _media_key(user_id), f"media:{event_id}"],
+            args, event_id, indexed
+        )
+        if not flat:
+            # Черновик истёк между get и переводом: индекс по пропущенному id не нужен
+            async with self.db.redis.pipeline(transaction=False) as pipe:
+                search.remove_from_index(pipe, event_id, indexed)
+                await pipe.execute()
+            return None
+        return event_id, dict(zip(flat[::2], flat[1::2]))
+
+drafts = DraftStore()
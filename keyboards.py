@@ -1,32 +1,107 @@
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
 
+import callbacks
+
+# Поля для редактирования: подпись кнопки и ключ в хеше мероприятия.
+# Индекс в списке передаётся в callback_data — порядок только дополнять.
+EDIT_FIELDS = [
+    ("Название", "title"),
+    ("Описание", "description"),
+    ("Дата", "date"),
+    ("Адрес", "address"),
+    ("Стоимость", "price"),
+    ("Ссылка", "link"),
+    ("Фото", "photo"),
+]
+
+def _button(text, callback_data):
+    return InlineKeyboardButton(text=text, callback_data=callback_data)
+
 def get_admin_keyboard():
     """Клавиатура для администратора"""
-    keyboard = ReplyKeyboardMarkup(resize_keyboard=True)
-    keyboard.add(KeyboardButton("📋 Список мероприятий"))
-    keyboard.add(KeyboardButton("⚙ Настройки рассылки"))
-    return keyboard
+    return ReplyKeyboardMarkup(
+        keyboard=[
+            [KeyboardButton(text="📋 Список мероприятий")],
+            [KeyboardButton(text="⚙ Настройки рассылки")],
+        ],
+        resize_keyboard=True
+    )
 
 def get_event_management_keyboard(event_id):
     """Клавиатура для управления мероприятием"""
-    keyboard = InlineKeyboardMarkup()
-    keyboard.add(InlineKeyboardButton("✏ Редактировать", callback_data=f"edit_{event_id}"))
-    keyboard.add(InlineKeyboardButton("⏰ Отложить публикацию", callback_data=f"schedule_{event_id}"))
-    keyboard.add(InlineKeyboardButton("✅ Опубликовать", callback_data=f"publish_{event_id}"))
-    keyboard.add(InlineKeyboardButton("❌ Отклонить", callback_data=f"reject_{event_id}"))
-    return keyboard
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [_button("✏ Редактировать", callbacks.encode(callbacks.EDIT, event_id))],
+        [_button("⏰ Отложить публикацию", callbacks.encode(callbacks.SCHEDULE, event_id))],
+        [_button("✅ Опубликовать", callbacks.encode(callbacks.PUBLISH, event_id))],
+        [_button("❌ Отклонить", callbacks.encode(callbacks.REJECT, event_id))],
+    ])
 
 def get_edit_keyboard(event_id):
     """Клавиатура для выбора поля редактирования"""
-    keyboard = InlineKeyboardMarkup()
-    fields = ["Название", "Описание", "Дата", "Адрес", "Стоимость", "Ссылка", "Фото"]
-    for field in fields:
-        keyboard.add(InlineKeyboardButton(field, callback_data=f"editfield_{event_id}_{field.lower()}"))
-    keyboard.add(InlineKeyboardButton("⬅ Назад", callback_data=f"back_{event_id}"))
-    return keyboard
+    rows = [
+        [_button(label, callbacks.encode(callbacks.EDIT_FIELD, event_id, index))]
+        for index, (label, _) in enumerate(EDIT_FIELDS)
+    ]
+    rows.append([_button("⬅ Назад", callbacks.encode(callbacks.BACK, event_id))])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
 
 def get_back_keyboard(event_id):
     """Клавиатура с кнопкой 'Назад'"""
-    keyboard = InlineKeyboardMarkup()
-    keyboard.add(InlineKeyboardButton("⬅ Назад", callback_data=f"back_{event_id}"))
-    return keyboard
\ No newline at end of file
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [_button("⬅ Назад", callbacks.encode(callbacks.BACK, event_id))]
+    ])
+
+def get_pending_list_keyboard(events, next_cursor=None, selected=()):
+    """Клавиатура страницы очереди модерации с отметками для массовых действий"""
+    rows = [
+        [
+            _button(f"#{event['id']} {event.get('title', '')}", callbacks.encode(callbacks.OPEN, event['id'])),
+            _button(selection_mark(str(event['id']) in selected), callbacks.encode(callbacks.SELECT, event['id']))
+        ]
+        for event in events
+    ]
+    if next_cursor is not None:
+        rows.append([_button("Далее ▶", callbacks.encode_cursor(callbacks.PENDING_PAGE, *next_cursor))])
+    rows.append([
+        _button("✅ Выбранные", callbacks.encode(callbacks.BULK_PUBLISH)),
+        _button("⏰ Выбранные", callbacks.encode(callbacks.BULK_SCHEDULE)),
+        _button("❌ Выбранные", callbacks.encode(callbacks.BULK_REJECT))
+    ])
+    rows.append([_button("Сбросить выбор", callbacks.encode(callbacks.CLEAR_SELECTION))])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+def get_search_keyboard(events, next_offset=None):
+    """Клавиатура страницы результатов поиска"""
+    rows = [
+        [_button(f"#{event['id']} {event.get('date', '')} {event.get('title', '')}", callbacks.encode(callbacks.OPEN, event['id']))]
+        for event in events
+    ]
+    if next_offset is not None:
+        rows.append([_button("Далее ▶", callbacks.encode(callbacks.SEARCH_PAGE, next_offset))])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+def selection_mark(selected):
+    return "☑" if selected else "☐"
+
+def mark_selected(markup, callback_data, selected):
+    """Та же клавиатура с обновлённой отметкой у одной кнопки"""
+    rows = [
+        [
+            button.model_copy(update={"text": selection_mark(selected)}) if button.callback_data == callback_data else button
+            for button in row
+        ]
+        for row in markup.inline_keyboard
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+def clear_marks(markup):
+    """Клавиатура страницы без отметок после массового действия"""
+    unselected = selection_mark(False)
+    rows = [
+        [
+            button.model_copy(update={"text": unselected}) if button.text == selection_mark(True) else button
+            for button in row
+        ]
+        for row in markup.inline_keyboard
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=rows)
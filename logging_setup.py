@@ -0,0 +1,105 @@
+import json
+import logging
+import logging.config
+import logging.handlers
+import queue
+import time
+
+from config import config
+
+# Логгеры из logging.conf, чьи обработчики уходят в фоновый поток
+QUEUED_LOGGERS = ("", "event_bot")
+
+listeners = []
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-строка на запись"""
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record, self.datefmt),
+            "logger": record.name,
+            "level": record.levelname,
+            "message": record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc_info"] = record.exc_text
+        if record.stack_info:
+            entry["stack_info"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+class RecordQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler, который не вклеивает traceback в текст сообщения.
+
+    Стандартный prepare() форматирует запись целиком и кладёт результат в
+    msg, поэтому JsonFormatter в потоке-слушателе видел traceback внутри
+    message. Здесь в очередь уходит только текст сообщения, а traceback —
+    отдельно в exc_text: текстовый Formatter допишет его сам, JSON — полем.
+    """
+    def prepare(self, record):
+        record = logging.makeLogRecord(record.__dict__)
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+class RepeatedErrorSampler(logging.Filter):
+    """Пропускает первые burst записей с одного места за окно, остальные считает.
+
+    Ключ — место вызова: сообщения собираются f-строками и каждый раз
+    разные. Когда окно закончилось, первая новая запись сообщает, сколько
+    похожих было отброшено.
+    """
+    def __init__(self, burst, window, level=logging.WARNING):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self.level = level
+        self.sites = {}
+
+    def filter(self, record):
+        if record.levelno < self.level:
+            return True
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        started, count, dropped = self.sites.get(key, (now, 0, 0))
+        if now - started >= self.window:
+            if dropped:
+                record.msg = f"{record.msg} [{dropped} similar records suppressed]"
+            started, count, dropped = now, 0, 0
+        if count < self.burst:
+            self.sites[key] = (started, count + 1, dropped)
+            return True
+        self.sites[key] = (started, count, dropped + 1)
+        return False
+
+def setup_logging(path='logging.conf'):
+    """Обработчики из logging.conf работают в фоновых потоках через очереди"""
+    logging.config.fileConfig(path, disable_existing_loggers=False)
+    sampler = RepeatedErrorSampler(config.log_sample_burst, config.log_sample_window)
+    for name in QUEUED_LOGGERS:
+        logger = logging.getLogger(name)
+        handlers = list(logger.handlers)
+        if not handlers:
+            continue
+        if config.log_format == "json":
+            for handler in handlers:
+                handler.setFormatter(JsonFormatter(datefmt=handler.formatter.datefmt if handler.formatter else None))
+        records = queue.SimpleQueue()
+        queue_handler = RecordQueueHandler(records)
+        queue_handler.addFilter(sampler)
+        for handler in handlers:
+            logger.removeHandler(handler)
+        logger.addHandler(queue_handler)
+        listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+        listener.start()
+        listeners.append(listener)
+
+def stop_logging():
+    """Дописывает накопленные записи и останавливает фоновые потоки"""
+    while listeners:
+        listeners.pop().stop()
@@ -1,47 +1,65 @@
+import asyncio
 import logging
-import logging.config
-from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.redis import RedisStorage
+import os
+import signal
+import socket
+import sys
+from aiogram import Dispatcher, F, types
+from aiogram.filters import Command, CommandObject, StateFilter
+from aiogram.fsm.storage.redis import DefaultKeyBuilder, RedisStorage
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.enums import ParseMode
 from datetime import datetime, timedelta
+import time
 import pytz
 from typing import Dict, Any, List
 
 # Локальные импорты
 from config import config
-from database import db
+from logging_setup import setup_logging, stop_logging
+from database import db, ARCHIVE_TOTALS
+import outbound
+import metrics
+import broadcast
+from outbox import outbox, scheduler
+from drafts import drafts
+from dedup import duplicates
+import media
+import search
+import callbacks
+from callbacks import router
 from keyboards import (
+    EDIT_FIELDS,
     get_admin_keyboard,
-    get_event_management_keyboard,
-    get_edit_keyboard,
-    get_back_keyboard
+    get_back_keyboard,
+    get_pending_list_keyboard,
+    get_search_keyboard,
+    mark_selected,
+    clear_marks
 )
 from utils import (
     validate_date,
-    format_event,
-    publish_to_channel,
-    notify_organizer
+    render_cache,
+    notify_organizer,
+    notify_organizers,
+    run_in_background,
+    send_event_to_admins
 )
 
-storage = RedisStorage.from_url(config.redis_url)
-
-# Настройка логирования
-logging.config.fileConfig('logging.conf')
+# Настройка логирования: запись в файл и stdout идёт в фоновом потоке
+setup_logging()
 logger = logging.getLogger(__name__)
 
-# Инициализация бота
-bot = Bot(token=config.bot_token)
-from aiogram.fsm.storage.redis import DefaultKeyBuilder, RedisStorage
-from redis.asyncio import ConnectionPool
+# Инициализация бота: общий с utils клиент с keep-alive сессией
+bot = outbound.bot
 
-redis_pool = ConnectionPool.from_url(
-    f"redis://{config.redis_host}:{config.redis_port}/{config.redis_db}"
-)
-storage = RedisStorage(redis_pool, key_builder=DefaultKeyBuilder(with_bot_id=True))
+# Хранилище FSM и db работают через один пул соединений
+storage = RedisStorage(db.redis, key_builder=DefaultKeyBuilder(with_bot_id=True))
 
-dp = Dispatcher(bot, storage=storage)
+dp = Dispatcher(storage=storage)
+dp.message.middleware(metrics.HandlerTimingMiddleware())
+dp.callback_query.middleware(metrics.HandlerTimingMiddleware())
 
 class EventStates(StatesGroup):
     waiting_for_title = State()
@@ -60,24 +78,32 @@ class AdminStates(StatesGroup):
     scheduling_time = State()
     sending_notification = State()
     setting_notification_frequency = State()
+    bulk_scheduling_time = State()
+    bulk_rejection = State()
 
 # ====================== ОБРАБОТЧИКИ КОМАНД ======================
 
-@dp.message_handler(commands=['start'])
+# Обработчики вне диалога срабатывают только без активного состояния FSM
+NO_STATE = StateFilter(None)
+
+def is_admin(message):
+    return message.from_user.id in config.admin_ids
+
+@dp.message(Command('start'), NO_STATE)
 async def cmd_start(message: types.Message):
     """Обработчик команды /start"""
     user_id = message.from_user.id
     username = message.from_user.username
     full_name = message.from_user.full_name
     
-    db.save_user(user_id, {
+    await db.save_user(user_id, {
         "username": username,
         "full_name": full_name,
         "last_active": datetime.now().isoformat(),
         "last_notified": None
     })
     
-    if user_id in config.ADMIN_IDS:
+    if user_id in config.admin_ids:
         await message.answer(
             "👋 Добро пожаловать, администратор!",
             reply_markup=get_admin_keyboard()
@@ -87,39 +113,48 @@ async def cmd_start(message: types.Message):
             "👋 Добро пожаловать! Чтобы создать мероприятие, нажмите /create_event"
         )
 
-@dp.message_handler(commands=['create_event'])
-async def cmd_create_event(message: types.Message):
+@dp.message(Command('create_event'), NO_STATE)
+async def cmd_create_event(message: types.Message, state: FSMContext):
     """Обработчик команды создания мероприятия"""
-    if message.from_user.id in config.ADMIN_IDS:
+    if message.from_user.id in config.admin_ids:
         await message.answer("Администраторы не могут создавать мероприятия.")
         return
     
-    await EventStates.waiting_for_title.set()
+    await drafts.start(message.from_user.id, {
+        "organizer": message.from_user.username or "",
+        "organizer_id": message.from_user.id
+    })
+    await state.set_state(EventStates.waiting_for_title)
     await message.answer("Введите название мероприятия:")
 
 # ====================== ОБРАБОТЧИКИ СОЗДАНИЯ МЕРОПРИЯТИЯ ======================
 
-@dp.message_handler(state=EventStates.waiting_for_title)
+async def draft_expired(message, state):
+    """Черновик истёк раньше состояния мастера: начинаем заново"""
+    await state.clear()
+    await message.answer("Черновик не найден или устарел. Начните заново: /create_event")
+
+@dp.message(EventStates.waiting_for_title)
 async def process_title(message: types.Message, state: FSMContext):
     """Обработчик названия мероприятия"""
-    async with state.proxy() as data:
-        data['title'] = message.text
-        data['organizer'] = message.from_user.username
-        data['organizer_id'] = message.from_user.id
+    if not await drafts.set(message.from_user.id, title=message.text):
+        await draft_expired(message, state)
+        return
     
-    await EventStates.next()
+    await state.set_state(EventStates.waiting_for_description)
     await message.answer("Введите описание мероприятия:")
 
-@dp.message_handler(state=EventStates.waiting_for_description)
+@dp.message(EventStates.waiting_for_description)
 async def process_description(message: types.Message, state: FSMContext):
     """Обработчик описания мероприятия"""
-    async with state.proxy() as data:
-        data['description'] = message.text
+    if not await drafts.set(message.from_user.id, description=message.text):
+        await draft_expired(message, state)
+        return
     
-    await EventStates.next()
+    await state.set_state(EventStates.waiting_for_date)
     await message.answer("Введите дату и время мероприятия в формате ДД.ММ.ГГГГ ЧЧ:ММ:")
 
-@dp.message_handler(state=EventStates.waiting_for_date)
+@dp.message(EventStates.waiting_for_date)
 async def process_date(message: types.Message, state: FSMContext):
     """Обработчик даты мероприятия"""
     date = validate_date(message.text)
@@ -127,23 +162,24 @@ async def process_date(message: types.Message, state: FSMContext):
         await message.answer("Неверный формат даты. Пожалуйста, введите дату в формате ДД.ММ.ГГГГ ЧЧ:ММ:")
         return
     
-    async with state.proxy() as data:
-        data['date'] = message.text
-        data['date_obj'] = date.isoformat()
+    if not await drafts.set(message.from_user.id, date=message.text, date_obj=date.isoformat()):
+        await draft_expired(message, state)
+        return
     
-    await EventStates.next()
+    await state.set_state(EventStates.waiting_for_address)
     await message.answer("Введите адрес мероприятия:")
 
-@dp.message_handler(state=EventStates.waiting_for_address)
+@dp.message(EventStates.waiting_for_address)
 async def process_address(message: types.Message, state: FSMContext):
     """Обработчик адреса мероприятия"""
-    async with state.proxy() as data:
-        data['address'] = message.text
+    if not await drafts.set(message.from_user.id, address=message.text):
+        await draft_expired(message, state)
+        return
     
-    await EventStates.next()
+    await state.set_state(EventStates.waiting_for_price)
     await message.answer("Введите стоимость мероприятия (0 если бесплатно):")
 
-@dp.message_handler(state=EventStates.waiting_for_price)
+@dp.message(EventStates.waiting_for_price)
 async def process_price(message: types.Message, state: FSMContext):
     """Обработчик стоимости мероприятия"""
     try:
@@ -152,153 +188,240 @@ async def process_price(message: types.Message, state: FSMContext):
         await message.answer("Пожалуйста, введите число:")
         return
     
-    async with state.proxy() as data:
-        data['price'] = price
+    if not await drafts.set(message.from_user.id, price=price):
+        await draft_expired(message, state)
+        return
     
-    await EventStates.next()
+    await state.set_state(EventStates.waiting_for_link)
     await message.answer("Введите ссылку на мероприятие (или '-' если нет ссылки):")
 
-@dp.message_handler(state=EventStates.waiting_for_link)
+@dp.message(EventStates.waiting_for_link)
 async def process_link(message: types.Message, state: FSMContext):
     """Обработчик ссылки на мероприятие"""
-    async with state.proxy() as data:
-        data['link'] = message.text
+    if not await drafts.set(message.from_user.id, link=message.text):
+        await draft_expired(message, state)
+        return
     
-    await EventStates.next()
+    await state.set_state(EventStates.waiting_for_photo)
     await message.answer("Отправьте фото мероприятия (или любой символ если фото нет):")
 
-@dp.message_handler(content_types=['photo', 'text'], state=EventStates.waiting_for_photo)
+# Сколько ждать остальные фото альбома: Telegram присылает их отдельными апдейтами
+ALBUM_WAIT = 1.5
+
+@dp.message(EventStates.waiting_for_photo, F.photo | F.text)
 async def process_photo(message: types.Message, state: FSMContext):
     """Обработчик фото мероприятия"""
-    async with state.proxy() as data:
-        if message.photo:
-            data['photo'] = message.photo[-1].file_id
+    if message.caption:
+        # Подпись к фото (у альбома — к одному из них) дополняет описание
+        await drafts.add_caption(message.from_user.id, message.caption)
+    if message.media_group_id and message.photo:
+        # Фото альбома копятся в черновике; каждое откладывает завершение,
+        # фото, пришедшие после отправки черновика, игнорируются
+        if await drafts.add_media(message.from_user.id, media.entry(message.photo), message.message_id):
+            run_in_background(finish_album(message, state))
+        return
+    entries = [media.entry(message.photo)] if message.photo else []
+    await submit_draft(message, state, entries)
+
+async def finish_album(message, state):
+    """Отправка альбома, если за паузу после этого фото новых не пришло"""
+    await asyncio.sleep(ALBUM_WAIT)
+    user_id = message.from_user.id
+    if not await drafts.is_last_media(user_id, message.message_id):
+        return
+    entries = await drafts.get_media(user_id)
+    if not entries:
+        return
+    await submit_draft(message, state, entries[:media.MAX_ALBUM])
+
+async def submit_draft(message, state, entries):
+    user_id = message.from_user.id
+    fields = media.event_fields(entries)
+    
+    # Повторная заявка не создаёт новое мероприятие и не рассылается заново
+    draft = await drafts.get(user_id)
+    duplicate_id = await duplicates.find({**draft, **fields}) if draft else None
+    if duplicate_id:
+        updated = await duplicates.merge(duplicate_id, {**draft, **fields}, entries)
+        await drafts.discard(user_id)
+        await state.clear()
+        if updated:
+            await message.answer(f"Это мероприятие уже на модерации (#{duplicate_id}), мы обновили его данные.")
         else:
-            data['photo'] = None
-        
-        # Сохраняем мероприятие
-        event_id = db.save_event(data.as_dict())
-        
-        # Отправляем администраторам
-        for admin_id in config.ADMIN_IDS:
-            try:
-                if data['photo']:
-                    await bot.send_photo(
-                        chat_id=admin_id,
-                        photo=data['photo'],
-                        caption=format_event(data.as_dict()),
-                        reply_markup=get_event_management_keyboard(event_id),
-                        parse_mode='HTML'
-                    )
-                else:
-                    await bot.send_message(
-                        chat_id=admin_id,
-                        text=format_event(data.as_dict()),
-                        reply_markup=get_event_management_keyboard(event_id),
-                        parse_mode='HTML'
-                    )
-            except Exception as e:
-                logger.error(f"Error sending event to admin {admin_id}: {e}")
+            await message.answer(f"Такое мероприятие уже на модерации (#{duplicate_id}).")
+        return
+    
+    # Черновик становится мероприятием одной атомарной операцией
+    promoted = await drafts.promote(user_id, draft, **fields)
+    if not promoted:
+        await draft_expired(message, state)
+        return
+    await state.clear()
     
-    await state.finish()
+    # Отправляем администраторам в фоне: организатору не нужно ждать
+    event_id, event = promoted
+    await duplicates.add(event_id, event)
+    run_in_background(send_event_to_admins(event_id, event))
     await message.answer("Спасибо! Ваше мероприятие отправлено на модерацию.")
 
 # ====================== АДМИНИСТРАТИВНЫЕ ОБРАБОТЧИКИ ======================
 
-@dp.callback_query_handler(lambda c: c.data.startswith('edit_'))
-async def process_edit_callback(callback_query: types.CallbackQuery):
+PENDING_PAGE_SIZE = 10
+
+async def send_pending_page(chat_id, cursor=None):
+    """Отправка страницы очереди модерации"""
+    events, next_cursor = await db.get_pending_events(cursor, PENDING_PAGE_SIZE)
+    if not events:
+        await bot.send_message(chat_id, "Очередь модерации пуста.")
+        return
+    total = await db.count_events("pending_events")
+    selected = await db.get_selection(chat_id)
+    await bot.send_message(
+        chat_id,
+        f"📋 Мероприятия на модерации: {total}",
+        reply_markup=get_pending_list_keyboard(events, next_cursor, selected)
+    )
+
+@dp.message(NO_STATE, is_admin, F.text == "📋 Список мероприятий")
+async def cmd_pending_list(message: types.Message):
+    """Обработчик списка мероприятий на модерации"""
+    await send_pending_page(message.from_user.id)
+
+@dp.callback_query()
+async def process_callback(callback_query: types.CallbackQuery, state: FSMContext):
+    """Единая точка входа для inline-кнопок"""
+    await router.dispatch(callback_query, state)
+
+async def send_event_card(chat_id, event_id):
+    """Отправка карточки мероприятия с кнопками управления"""
+    event = await db.get_event(event_id)
+    if not event:
+        await bot.send_message(chat_id, "Мероприятие не найдено.")
+        return
+    text, markup = render_cache.card(event_id, event)
+    if event.get('photo'):
+        await bot.send_photo(
+            chat_id=chat_id,
+            photo=media.preview_photo(event),
+            caption=text,
+            reply_markup=markup,
+            parse_mode='HTML'
+        )
+    else:
+        await bot.send_message(
+            chat_id=chat_id,
+            text=text,
+            reply_markup=markup,
+            parse_mode='HTML'
+        )
+
+@router.register(callbacks.PENDING_PAGE)
+async def process_pending_page_callback(callback_query: types.CallbackQuery, state: FSMContext, cursor, field):
+    """Обработчик перехода на следующую страницу очереди"""
+    await bot.answer_callback_query(callback_query.id)
+    await send_pending_page(callback_query.from_user.id, cursor)
+
+@router.register(callbacks.OPEN)
+async def process_open_callback(callback_query: types.CallbackQuery, state: FSMContext, event_id, field):
+    """Обработчик открытия мероприятия из очереди"""
+    await bot.answer_callback_query(callback_query.id)
+    await send_event_card(callback_query.from_user.id, event_id)
+
+@router.register(callbacks.BACK)
+async def process_back_callback(callback_query: types.CallbackQuery, state: FSMContext, event_id, field):
+    """Обработчик кнопки 'Назад': отмена ввода и возврат к карточке"""
+    await state.clear()
+    await bot.answer_callback_query(callback_query.id)
+    await send_event_card(callback_query.from_user.id, event_id)
+
+@router.register(callbacks.EDIT)
+async def process_edit_callback(callback_query: types.CallbackQuery, state: FSMContext, event_id, field):
     """Обработчик кнопки редактирования"""
-    event_id = callback_query.data.split('_')[1]
     await bot.answer_callback_query(callback_query.id)
     await bot.send_message(
         callback_query.from_user.id,
         "Выберите поле для редактирования:",
-        reply_markup=get_edit_keyboard(event_id)
+        reply_markup=render_cache.edit_keyboard(event_id)
     )
 
-@dp.callback_query_handler(lambda c: c.data.startswith('editfield_'))
-async def process_edit_field_callback(callback_query: types.CallbackQuery, state: FSMContext):
+@router.register(callbacks.EDIT_FIELD)
+async def process_edit_field_callback(callback_query: types.CallbackQuery, state: FSMContext, event_id, field_index):
     """Обработчик выбора поля для редактирования"""
-    _, event_id, field = callback_query.data.split('_')
-    
-    await AdminStates.editing_event.set()
-    async with state.proxy() as data:
-        data['event_id'] = event_id
-        data['field'] = field
+    if field_index >= len(EDIT_FIELDS):
+        await bot.answer_callback_query(callback_query.id, "Неизвестное поле", show_alert=True)
+        return
+    label, field = EDIT_FIELDS[field_index]
     
-    await AdminStates.editing_value.set()
+    await state.set_state(AdminStates.editing_value)
+    await state.update_data(event_id=event_id, field=field)
     await bot.answer_callback_query(callback_query.id)
     await bot.send_message(
         callback_query.from_user.id,
-        f"Введите новое значение для поля '{field}':"
+        f"Введите новое значение для поля '{label}':"
     )
 
-@dp.message_handler(state=AdminStates.editing_value)
+@dp.message(AdminStates.editing_value)
 async def process_editing_value(message: types.Message, state: FSMContext):
     """Обработчик нового значения для поля"""
-    async with state.proxy() as data:
-        event_id = data['event_id']
-        field = data['field']
-        event = db.get_event(event_id)
-        
-        if field == 'дата':
-            new_date = validate_date(message.text)
-            if not new_date:
-                await message.answer("Неверный формат даты. Пожалуйста, введите дату в формате ДД.ММ.ГГГГ ЧЧ:ММ:")
-                return
-            event['date'] = message.text
-            event['date_obj'] = new_date.isoformat()
-        elif field == 'стоимость':
-            try:
-                event['price'] = int(message.text)
-            except ValueError:
-                await message.answer("Пожалуйста, введите число:")
-                return
-        elif field == 'фото':
-            if message.photo:
-                event['photo'] = message.photo[-1].file_id
-            else:
-                event['photo'] = None
-        else:
-            event[field] = message.text
-        
-        db.update_event(event_id, event)
-        
-        if event['photo']:
-            await bot.send_photo(
-                chat_id=message.from_user.id,
-                photo=event['photo'],
-                caption=format_event(event),
-                reply_markup=get_event_management_keyboard(event_id),
-                parse_mode='HTML'
-            )
-        else:
-            await bot.send_message(
-                chat_id=message.from_user.id,
-                text=format_event(event),
-                reply_markup=get_event_management_keyboard(event_id),
-                parse_mode='HTML'
-            )
+    data = await state.get_data()
+    event_id = data['event_id']
+    field = data['field']
+    event = await db.get_event(event_id)
     
-    await state.finish()
-
-@dp.callback_query_handler(lambda c: c.data.startswith('schedule_'))
-async def process_schedule_callback(callback_query: types.CallbackQuery, state: FSMContext):
-    """Обработчик отложенной публикации"""
-    event_id = callback_query.data.split('_')[1]
+    if field == 'date':
+        new_date = validate_date(message.text)
+        if not new_date:
+            await message.answer("Неверный формат даты. Пожалуйста, введите дату в формате ДД.ММ.ГГГГ ЧЧ:ММ:")
+            return
+        event['date'] = message.text
+        event['date_obj'] = new_date.isoformat()
+    elif field == 'price':
+        try:
+            event['price'] = int(message.text)
+        except ValueError:
+            await message.answer("Пожалуйста, введите число:")
+            return
+    elif field == 'photo':
+        # Новое фото заменяет и альбом целиком
+        entries = [media.entry(message.photo)] if message.photo else []
+        event.update(media.event_fields(entries))
+        await db.set_media(event_id, entries)
+    else:
+        event[field] = message.text
     
-    await AdminStates.scheduling_post.set()
-    async with state.proxy() as data:
-        data['event_id'] = event_id
+    event['rev'] = await db.update_event(event_id, event)
+    
+    text, markup = render_cache.card(event_id, event)
+    if event.get('photo'):
+        await bot.send_photo(
+            chat_id=message.from_user.id,
+            photo=media.preview_photo(event),
+            caption=text,
+            reply_markup=markup,
+            parse_mode='HTML'
+        )
+    else:
+        await bot.send_message(
+            chat_id=message.from_user.id,
+            text=text,
+            reply_markup=markup,
+            parse_mode='HTML'
+        )
     
-    await AdminStates.scheduling_time.set()
+    await state.clear()
+
+@router.register(callbacks.SCHEDULE)
+async def process_schedule_callback(callback_query: types.CallbackQuery, state: FSMContext, event_id, field):
+    """Обработчик отложенной публикации"""
+    await state.set_state(AdminStates.scheduling_time)
+    await state.update_data(event_id=event_id)
     await bot.answer_callback_query(callback_query.id)
     await bot.send_message(
         callback_query.from_user.id,
         "Введите дату и время публикации в формате ДД.ММ.ГГГГ ЧЧ:ММ:"
     )
 
-@dp.message_handler(state=AdminStates.scheduling_time)
+@dp.message(AdminStates.scheduling_time)
 async def process_scheduling_time(message: types.Message, state: FSMContext):
     """Обработчик времени публикации"""
     publish_time = validate_date(message.text)
@@ -306,45 +429,34 @@ async def process_scheduling_time(message: types.Message, state: FSMContext):
         await message.answer("Неверный формат даты. Пожалуйста, введите дату в формате ДД.ММ.ГГГГ ЧЧ:ММ:")
         return
     
-    async with state.proxy() as data:
-        event_id = data['event_id']
-        event = db.get_event(event_id)
-        
-        from tasks import schedule_post
-        schedule_post.apply_async(
-            args=[event_id, event],
-            eta=publish_time
-        )
-        
+    if publish_time.timestamp() <= time.time():
+        await message.answer("Время публикации уже прошло. Введите дату в будущем:")
+        return
+    
+    event_id = (await state.get_data())['event_id']
+    
+    # Сохраняется только срок: при публикации берётся актуальная версия мероприятия
+    if await scheduler.schedule(event_id, publish_time):
         await message.answer(f"Мероприятие запланировано к публикации на {message.text}")
+    else:
+        await message.answer("Мероприятие уже обработано другим администратором.")
     
-    await state.finish()
+    await state.clear()
 
-@dp.callback_query_handler(lambda c: c.data.startswith('publish_'))
-async def process_publish_callback(callback_query: types.CallbackQuery):
+@router.register(callbacks.PUBLISH)
+async def process_publish_callback(callback_query: types.CallbackQuery, state: FSMContext, event_id, field):
     """Обработчик публикации мероприятия"""
-    event_id = callback_query.data.split('_')[1]
-    event = db.get_event(event_id)
-    
-    success = await publish_to_channel(event_id, event)
-    if success:
-        db.move_event(event_id, "pending_events", "published_events")
-        await notify_organizer(
-            event['organizer_id'],
-            "✅ Ваше мероприятие было опубликовано!"
-        )
-        await bot.answer_callback_query(callback_query.id, "Мероприятие опубликовано!")
-    else:
-        await bot.answer_callback_query(callback_query.id, "Ошибка публикации!", show_alert=True)
+    # Публикация идёт через outbox: ответ не ждёт Telegram, повторы переживают сбои
+    if not await outbox.enqueue(event_id, callback_query.from_user.id):
+        await bot.answer_callback_query(callback_query.id, "Мероприятие уже обработано.", show_alert=True)
+        return
+    await bot.answer_callback_query(callback_query.id, "Мероприятие поставлено в очередь публикации")
 
-@dp.callback_query_handler(lambda c: c.data.startswith('reject_'))
-async def process_reject_callback(callback_query: types.CallbackQuery, state: FSMContext):
+@router.register(callbacks.REJECT)
+async def process_reject_callback(callback_query: types.CallbackQuery, state: FSMContext, event_id, field):
     """Обработчик отклонения мероприятия"""
-    event_id = callback_query.data.split('_')[1]
-    
-    await AdminStates.editing_event.set()
-    async with state.proxy() as data:
-        data['event_id'] = event_id
+    await state.set_state(AdminStates.editing_event)
+    await state.update_data(event_id=event_id)
     
     await bot.answer_callback_query(callback_query.id)
     await bot.send_message(
@@ -353,40 +465,210 @@ async def process_reject_callback(callback_query: types.CallbackQuery, state: FS
         reply_markup=get_back_keyboard(event_id)
     )
 
-@dp.message_handler(state=AdminStates.editing_event)
+@dp.message(AdminStates.editing_event)
 async def process_rejection_reason(message: types.Message, state: FSMContext):
     """Обработчик причины отклонения"""
-    async with state.proxy() as data:
-        event_id = data['event_id']
-        event = db.get_event(event_id)
-        
-        db.move_event(event_id, "pending_events", "rejected_events")
+    event_id = (await state.get_data())['event_id']
+    
+    await state.clear()
+    if not await db.move_event(event_id, "pending_events", "rejected_events"):
+        await message.answer("Мероприятие уже обработано другим администратором.")
+        return
+    
+    event = await db.get_event(event_id)
+    if event.get('organizer_id'):
         await notify_organizer(
             event['organizer_id'],
             f"❌ Ваше мероприятие было отклонено. Причина: {message.text}"
         )
-    
-    await state.finish()
     await message.answer("Мероприятие отклонено, организатор уведомлен.")
 
+# ====================== ПОИСК ======================
+
+SEARCH_PAGE_SIZE = 10
+SEARCH_HELP = (
+    "Поиск: /search слова дата:ДД.ММ.ГГГГ[-ДД.ММ.ГГГГ] или дата:выходные, "
+    "цена:0, цена:-500, цена:100-500, статус:pending|published|rejected|scheduled, "
+    "организатор:<id>"
+)
+
+async def send_search_page(chat_id, text, offset=0):
+    """Отправка страницы результатов поиска"""
+    try:
+        query = search.parse_query(text)
+    except ValueError:
+        await bot.send_message(chat_id, SEARCH_HELP)
+        return
+    events, total = await db.search_events(query, offset, SEARCH_PAGE_SIZE)
+    if not events:
+        await bot.send_message(chat_id, "Ничего не найдено.")
+        return
+    next_offset = offset + SEARCH_PAGE_SIZE if offset + SEARCH_PAGE_SIZE < total else None
+    await bot.send_message(
+        chat_id,
+        f"🔎 Найдено: {total}, показаны {offset + 1}–{offset + len(events)}",
+        reply_markup=get_search_keyboard(events, next_offset)
+    )
+
+@dp.message(Command('search'), NO_STATE, is_admin)
+async def cmd_search(message: types.Message, command: CommandObject):
+    """Обработчик поиска мероприятий"""
+    text = command.args
+    if not text:
+        await message.answer(SEARCH_HELP)
+        return
+    # Запрос хранится для кнопки «Далее»: в callback_data помещается только смещение
+    await db.redis.set(f"search:last:{message.from_user.id}", text, ex=3600)
+    await send_search_page(message.from_user.id, text)
+
+@router.register(callbacks.SEARCH_PAGE)
+async def process_search_page_callback(callback_query: types.CallbackQuery, state: FSMContext, offset, field):
+    """Обработчик перехода на следующую страницу поиска"""
+    text = await db.redis.get(f"search:last:{callback_query.from_user.id}")
+    if not text:
+        await bot.answer_callback_query(callback_query.id, "Поиск устарел, повторите /search", show_alert=True)
+        return
+    await bot.answer_callback_query(callback_query.id)
+    await send_search_page(callback_query.from_user.id, text, offset)
+
+@dp.message(Command('archive_stats'), NO_STATE, is_admin)
+async def cmd_archive_stats(message: types.Message):
+    """Обработчик отчёта об архиве мероприятий"""
+    report = await db.archive_report()
+    archive = report["archive"]
+    if archive is None:
+        # Файл архива лежит у другой реплики: здесь известны только итоги из Redis
+        await message.answer(
+            f"🗄 В архиве: {report['archived_events']} мероприятий, файл на {report['owner'] or 'не создан'}\n"
+            f"Освобождено в Redis: {report['reclaimed_bytes'] / 1024:.1f} КБ"
+        )
+        return
+    await message.answer(
+        f"🗄 В архиве: {archive['events']} мероприятий, {archive['segments']} сегментов ({archive['codec']})\n"
+        f"Размер архива: {archive['file_bytes'] / 1024:.1f} КБ, данных {archive['stored_bytes'] / 1024:.1f} КБ\n"
+        f"Освобождено в Redis: {report['reclaimed_bytes'] / 1024:.1f} КБ"
+    )
+
+# ====================== МАССОВАЯ МОДЕРАЦИЯ ======================
+
+@router.register(callbacks.SELECT)
+async def process_select_callback(callback_query: types.CallbackQuery, state: FSMContext, event_id, field):
+    """Обработчик отметки мероприятия в списке очереди"""
+    selected = await db.toggle_selected(callback_query.from_user.id, event_id)
+    await bot.answer_callback_query(callback_query.id)
+    await bot.edit_message_reply_markup(
+        chat_id=callback_query.from_user.id,
+        message_id=callback_query.message.message_id,
+        reply_markup=mark_selected(callback_query.message.reply_markup, callback_query.data, selected)
+    )
+
+async def reset_page_marks(callback_query):
+    """Снятие отметок на странице, с которой запущено массовое действие"""
+    await bot.edit_message_reply_markup(
+        chat_id=callback_query.from_user.id,
+        message_id=callback_query.message.message_id,
+        reply_markup=clear_marks(callback_query.message.reply_markup)
+    )
+
+@router.register(callbacks.CLEAR_SELECTION)
+async def process_clear_selection_callback(callback_query: types.CallbackQuery, state: FSMContext, arg, field):
+    """Обработчик сброса выбора"""
+    await db.take_selection(callback_query.from_user.id)
+    await bot.answer_callback_query(callback_query.id, "Выбор сброшен")
+    await reset_page_marks(callback_query)
+
+@router.register(callbacks.BULK_PUBLISH)
+async def process_bulk_publish_callback(callback_query: types.CallbackQuery, state: FSMContext, arg, field):
+    """Обработчик публикации всех выбранных мероприятий"""
+    event_ids = await db.take_selection(callback_query.from_user.id)
+    if not event_ids:
+        await bot.answer_callback_query(callback_query.id, "Ничего не выбрано", show_alert=True)
+        return
+    # Переходы одним пайплайном, посты и уведомления уходят из outbox по лимиту
+    queued = await outbox.enqueue_many(event_ids)
+    await bot.answer_callback_query(
+        callback_query.id,
+        f"В очередь публикации: {len(queued)} из {len(event_ids)}",
+        show_alert=True
+    )
+    await reset_page_marks(callback_query)
+
+@router.register(callbacks.BULK_SCHEDULE)
+async def process_bulk_schedule_callback(callback_query: types.CallbackQuery, state: FSMContext, arg, field):
+    """Обработчик отложенной публикации выбранных мероприятий"""
+    if not await db.get_selection(callback_query.from_user.id):
+        await bot.answer_callback_query(callback_query.id, "Ничего не выбрано", show_alert=True)
+        return
+    await state.set_state(AdminStates.bulk_scheduling_time)
+    await bot.answer_callback_query(callback_query.id)
+    await bot.send_message(
+        callback_query.from_user.id,
+        "Введите дату и время публикации выбранных мероприятий в формате ДД.ММ.ГГГГ ЧЧ:ММ:"
+    )
+
+@dp.message(AdminStates.bulk_scheduling_time)
+async def process_bulk_scheduling_time(message: types.Message, state: FSMContext):
+    """Обработчик времени публикации выбранных мероприятий"""
+    publish_time = validate_date(message.text)
+    if not publish_time:
+        await message.answer("Неверный формат даты. Пожалуйста, введите дату в формате ДД.ММ.ГГГГ ЧЧ:ММ:")
+        return
+    
+    if publish_time.timestamp() <= time.time():
+        await message.answer("Время публикации уже прошло. Введите дату в будущем:")
+        return
+    
+    await state.clear()
+    event_ids = await db.take_selection(message.from_user.id)
+    scheduled = await scheduler.schedule_many(event_ids, publish_time)
+    await message.answer(f"Запланировано на {message.text}: {len(scheduled)} из {len(event_ids)}")
+
+@router.register(callbacks.BULK_REJECT)
+async def process_bulk_reject_callback(callback_query: types.CallbackQuery, state: FSMContext, arg, field):
+    """Обработчик отклонения выбранных мероприятий"""
+    if not await db.get_selection(callback_query.from_user.id):
+        await bot.answer_callback_query(callback_query.id, "Ничего не выбрано", show_alert=True)
+        return
+    await state.set_state(AdminStates.bulk_rejection)
+    await bot.answer_callback_query(callback_query.id)
+    await bot.send_message(
+        callback_query.from_user.id,
+        "Введите причину отклонения выбранных мероприятий:"
+    )
+
+@dp.message(AdminStates.bulk_rejection)
+async def process_bulk_rejection_reason(message: types.Message, state: FSMContext):
+    """Обработчик причины массового отклонения"""
+    await state.clear()
+    event_ids = await db.take_selection(message.from_user.id)
+    rejected = await db.move_events(event_ids, "pending_events", "rejected_events")
+    
+    # Организаторы уведомляются фоном: по одному сообщению на человека
+    events = await db.get_events(rejected)
+    organizer_ids = {event['organizer_id'] for event in events if event.get('organizer_id')}
+    run_in_background(notify_organizers(
+        organizer_ids,
+        f"❌ Ваше мероприятие было отклонено. Причина: {message.text}"
+    ))
+    await message.answer(f"Отклонено: {len(rejected)} из {len(event_ids)}, организаторы будут уведомлены.")
+
 # ====================== РАССЫЛКА УВЕДОМЛЕНИЙ ======================
 
-@dp.message_handler(lambda message: message.from_user.id in config.ADMIN_IDS and message.text == "⚙ Настройки рассылки")
-async def cmd_notification_settings(message: types.Message):
+@dp.message(NO_STATE, is_admin, F.text == "⚙ Настройки рассылки")
+async def cmd_notification_settings(message: types.Message, state: FSMContext):
     """Обработчик настроек рассылки"""
-    await AdminStates.sending_notification.set()
+    await state.set_state(AdminStates.sending_notification)
     await message.answer("Введите сообщение для рассылки организаторам:")
 
-@dp.message_handler(state=AdminStates.sending_notification)
+@dp.message(AdminStates.sending_notification)
 async def process_notification_message(message: types.Message, state: FSMContext):
     """Обработчик сообщения для рассылки"""
-    async with state.proxy() as data:
-        data['message'] = message.text
+    await state.update_data(message=message.text)
     
-    await AdminStates.next()
+    await state.set_state(AdminStates.setting_notification_frequency)
     await message.answer("Введите частоту рассылки в днях (например, 7 для еженедельной рассылки):")
 
-@dp.message_handler(state=AdminStates.setting_notification_frequency)
+@dp.message(AdminStates.setting_notification_frequency)
 async def process_notification_frequency(message: types.Message, state: FSMContext):
     """Обработчик частоты рассылки"""
     try:
@@ -397,26 +679,127 @@ async def process_notification_frequency(message: types.Message, state: FSMConte
         await message.answer("Пожалуйста, введите положительное число:")
         return
     
-    async with state.proxy() as data:
-        notification_message = data['message']
-        inactive_users = db.get_inactive_organizers(frequency)
-        
-        for user_id in inactive_users:
+    notification_message = (await state.get_data())['message']
+    
+    # Рассылка идёт фоновым заданием в Redis и переживает перезапуск
+    job_id = await broadcast.create_job(message.from_user.id, notification_message, frequency)
+    await message.answer(f"Рассылка #{job_id} запущена, прогресс будет обновляться выше.")
+    
+    await state.clear()
+
+CONFIG_RELOAD_CHANNEL = "config:reload"
+
+def reload_config(source):
+    """Перезагрузка настроек; некорректное окружение оставляет прежние"""
+    try:
+        config.reload()
+    except Exception as e:
+        logger.error(f"Config reload via {source} failed, keeping previous settings: {e!r}")
+    else:
+        logger.info(f"Config reloaded via {source}")
+
+async def listen_config_reload():
+    """Перезагрузка настроек по сообщению в Redis (для всех реплик сразу)"""
+    while True:
+        try:
+            async with db.redis.pubsub() as pubsub:
+                await pubsub.subscribe(CONFIG_RELOAD_CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        reload_config("Redis")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Config reload listener failed: {e!r}")
+            await asyncio.sleep(5)
+
+QUEUE_SETS = ("pending_events", "scheduled_events", "publish_outbox", "publish_inflight")
+
+async def collect_queue_depths():
+    """Размеры очередей на момент запроса /metrics"""
+    async with db.redis.pipeline(transaction=False) as pipe:
+        for key in QUEUE_SETS:
+            pipe.zcard(key)
+        pipe.scard(broadcast.ACTIVE_JOBS)
+        sizes = await pipe.execute()
+    for key, size in zip(QUEUE_SETS + ("broadcast_jobs",), sizes):
+        metrics.queue_depth.set(key, value=size)
+
+metrics.registry.add_collector(collect_queue_depths)
+
+async def collect_archive_totals():
+    """Итоги архивации из Redis: сам архив на каждый scrape не читается"""
+    totals = await db.redis.hgetall(ARCHIVE_TOTALS)
+    for kind in ("events", "reclaimed_bytes"):
+        metrics.archive_totals.set(kind, value=int(totals.get(kind, 0)))
+
+metrics.registry.add_collector(collect_archive_totals)
+
+async def archive_periodically():
+    """Периодический перенос завершённых мероприятий в архив"""
+    while True:
+        # Архивирует только реплика с файлом архива; аренда — от нескольких её процессов
+        if not await db.owns_archive(claim=True):
+            await db.check_archive_owner()
+        elif await db.redis.set(
+            "archive:lease", f"{socket.gethostname()}:{os.getpid()}", nx=True, ex=config.archive_interval
+        ):
             try:
-                await bot.send_message(
-                    chat_id=user_id,
-                    text=notification_message
-                )
-                db.update_user(user_id, {"last_notified": datetime.now().isoformat()})
+                await db.archive_finished()
             except Exception as e:
-                logger.error(f"Error sending notification to {user_id}: {e}")
-        
-        await message.answer(
-            f"Рассылка выполнена. Сообщение отправлено {len(inactive_users)} организаторам. "
-            f"Следующая рассылка через {frequency} дней."
-        )
-    
-    await state.finish()
+                logger.error(f"Archiving failed: {e!r}")
+        await asyncio.sleep(config.archive_interval)
+
+async def on_startup(dispatcher):
+    """Действия при запуске бота"""
+    if metrics_port:
+        await metrics.serve(config.metrics_host, metrics_port)
+    asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, reload_config, "SIGHUP")
+    run_in_background(listen_config_reload())
+    await db.migrate_status_sets()
+    await db.migrate_user_indexes()
+    await db.migrate_search_index()
+    await broadcast.resume_jobs()
+    run_in_background(broadcast.resume_periodically())
+    run_in_background(scheduler.run())
+    run_in_background(outbox.run())
+    run_in_background(archive_periodically())
+
+async def on_shutdown(dispatcher):
+    """Действия при остановке бота"""
+    scheduler.stop()
+    outbox.stop()
+    logger.info(f"Bot API latency: {outbound.stats.snapshot()}")
+    logger.info(f"Render cache: {render_cache.stats()}")
+    await outbound.close()
+    await db.close()
+    stop_logging()
+
+async def run_polling():
+    """Запуск бота в режиме long polling"""
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
+    await bot.delete_webhook(drop_pending_updates=True)
+    await dp.start_polling(bot)
+
+# Порт сервера метрик этого процесса; 0 — не поднимать
+metrics_port = config.metrics_port
 
 if __name__ == '__main__':
-    executor.start_polling(dp, skip_updates=True)
+    if sys.argv[1:2] == ['worker']:
+        # python main.py worker [шард ...] — обработчик апдейтов из потоков Redis
+        from streams import run_stream_worker
+        shards = [int(shard) for shard in sys.argv[2:]] or list(range(config.stream_shards))
+        if metrics_port:
+            # Шарды у обработчиков не пересекаются: METRICS_PORT + 1 + первый шард
+            metrics_port += 1 + min(shards)
+        run_stream_worker(dp, bot, shards, on_startup, on_shutdown)
+    elif config.stream_shards and not config.webhook_url:
+        from streams import run_stream_ingest
+        run_stream_ingest(dp, bot, on_startup, on_shutdown)
+    elif config.webhook_url:
+        # WEBHOOK_URL задан — апдейты принимает aiohttp-сервер, реплик может быть несколько
+        from webhook import run_webhook
+        run_webhook(dp, bot, on_startup, on_shutdown)
+    else:
+        asyncio.run(run_polling())
@@ -0,0 +1,67 @@
+import json
+
+from aiogram.types import InputMediaPhoto
+
+# Превью для администраторов: наименьший размер, у которого большая сторона не меньше этой
+PREVIEW_SIDE = 320
+# Предел Telegram для sendMediaGroup
+MAX_ALBUM = 10
+
+# Поля хеша мероприятия, которые описывают первое (или единственное) фото
+PHOTO_FIELDS = ("photo", "photo_preview", "photo_width", "photo_height", "photo_size", "media_count")
+
+def pick_preview(sizes):
+    """Размер фото для превью из message.photo (отсортированы по возрастанию)"""
+    for size in sizes:
+        if max(size.width, size.height) >= PREVIEW_SIDE:
+            return size
+    return sizes[-1]
+
+def entry(sizes):
+    """Запись реестра по размерам одного фото: полный file_id, превью, размеры"""
+    full, preview = sizes[-1], pick_preview(sizes)
+    return {
+        "file_id": full.file_id,
+        "preview_id": preview.file_id,
+        "width": full.width,
+        "height": full.height,
+        "size": full.file_size or 0,
+    }
+
+def dumps(item):
+    return json.dumps(item, separators=(",", ":"))
+
+def loads(raw):
+    return json.loads(raw)
+
+def event_fields(entries):
+    """Поля хеша мероприятия по записям реестра; None удаляет поле"""
+    if not entries:
+        return dict.fromkeys(PHOTO_FIELDS)
+    first = entries[0]
+    return {
+        "photo": first["file_id"],
+        "photo_preview": first["preview_id"],
+        "photo_width": first["width"],
+        "photo_height": first["height"],
+        "photo_size": first["size"],
+        "media_count": len(entries),
+    }
+
+def is_album(event):
+    return int(event.get('media_count') or 0) > 1
+
+def preview_photo(event):
+    """file_id для карточек администраторам: превью, если оно известно"""
+    return event.get('photo_preview') or event.get('photo')
+
+def album(entries, caption):
+    """Альбом для sendMediaGroup; подпись — у первого фото"""
+    return [
+        InputMediaPhoto(
+            media=item["file_id"],
+            caption=caption if index == 0 else None,
+            parse_mode='HTML' if index == 0 else None
+        )
+        for index, item in enumerate(entries[:MAX_ALBUM])
+    ]
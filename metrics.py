@@ -0,0 +1,254 @@
+import cProfile
+import heapq
+import io
+import itertools
+import logging
+import pstats
+import random
+import time
+from contextvars import ContextVar
+
+from aiohttp import web
+from aiogram import BaseMiddleware
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Время в Redis и Bot API внутри текущего апдейта
+current_update = ContextVar("current_update", default=None)
+# Имя обработчика, если его выбрал callbacks.router, а не сам aiogram
+handler_label = ContextVar("handler_label", default=None)
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, labels
+        self.values = {}
+
+    def inc(self, *labels, value=1):
+        self.values[labels] = self.values.get(labels, 0) + value
+
+    def render(self):
+        for labels, value in self.values.items():
+            yield f"{self.name}{_labels(self.labels, labels)} {value}"
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, *labels, value):
+        self.values[labels] = value
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        self.values = {}
+
+    def observe(self, *labels, value):
+        counts, total = self.values.get(labels, (None, 0.0))
+        if counts is None:
+            counts = [0] * (len(self.buckets) + 1)
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[index] += 1
+                break
+        else:
+            counts[-1] += 1
+        self.values[labels] = (counts, total + value)
+
+    def render(self):
+        names = self.labels + ("le",)
+        for labels, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                yield f"{self.name}_bucket{_labels(names, labels + (bound,))} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labels, labels)} {total}"
+            yield f"{self.name}_count{_labels(self.labels, labels)} {cumulative}"
+
+class Registry:
+    """Метрики процесса и функции, снимающие значения в момент запроса"""
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    async def render(self):
+        for collector in self.collectors:
+            try:
+                await collector()
+            except Exception as e:
+                logger.warning(f"Metrics collector {collector.__name__} failed: {e}")
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+handler_latency = registry.register(Histogram(
+    "bot_handler_duration_seconds", "Handler latency", ("handler",)))
+handler_errors = registry.register(Counter(
+    "bot_handler_errors_total", "Handlers that raised", ("handler",)))
+redis_latency = registry.register(Histogram(
+    "bot_redis_command_duration_seconds", "Redis command latency", ("command",)))
+api_latency = registry.register(Histogram(
+    "bot_api_request_duration_seconds", "Bot API request latency", ("method",)))
+api_errors = registry.register(Counter(
+    "bot_api_errors_total", "Failed Bot API requests", ("method",)))
+queue_depth = registry.register(Gauge(
+    "bot_queue_depth", "Events per status set", ("queue",)))
+stream_lag = registry.register(Gauge(
+    "bot_stream_lag", "Stream entries not yet read (lag) or not yet acked (pending)", ("shard", "kind")))
+archive_totals = registry.register(Gauge(
+    "bot_archive_total", "Archived events and reclaimed Redis bytes", ("kind",)))
+
+def _account(kind, elapsed):
+    stats = current_update.get()
+    if stats is not None:
+        stats[f"{kind}_time"] += elapsed
+        stats[f"{kind}_calls"] += 1
+
+def observe_api(method, elapsed, ok):
+    """Вызывается из middleware сессии Bot API"""
+    api_latency.observe(method, value=elapsed)
+    if not ok:
+        api_errors.inc(method)
+    _account("api", elapsed)
+
+class InstrumentedPipeline(Pipeline):
+    async def execute(self, raise_on_error=True):
+        start = time.perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        finally:
+            elapsed = time.perf_counter() - start
+            redis_latency.observe("PIPELINE", value=elapsed)
+            _account("redis", elapsed)
+
+class InstrumentedRedis(Redis):
+    """Redis-клиент с замером каждой команды и пайплайна"""
+    async def execute_command(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            elapsed = time.perf_counter() - start
+            redis_latency.observe(str(args[0]).upper(), value=elapsed)
+            _account("redis", elapsed)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+class SlowUpdates:
+    """Самые медленные апдейты с разбивкой времени; часть из них профилируется"""
+    def __init__(self, size, sample_rate):
+        self.size = size
+        self.sample_rate = sample_rate
+        self.heap = []
+        self.order = itertools.count()
+        self.profiling = False
+
+    def record(self, entry):
+        item = (entry["duration"], next(self.order), entry)
+        if len(self.heap) < self.size:
+            heapq.heappush(self.heap, item)
+        elif item > self.heap[0]:
+            heapq.heapreplace(self.heap, item)
+
+    def should_profile(self):
+        # cProfile один на поток: одновременно профилируется только один апдейт,
+        # и в профиль попадают задачи, выполнявшиеся в это же время
+        return not self.profiling and self.sample_rate and random.random() < self.sample_rate
+
+    def dump(self):
+        return [entry for _, _, entry in sorted(self.heap, reverse=True)]
+
+slow_updates = SlowUpdates(config.slow_updates_size, config.profile_sample_rate)
+
+class HandlerTimingMiddleware(BaseMiddleware):
+    """Гистограмма задержки по обработчикам и учёт медленных апдейтов"""
+    async def __call__(self, handler, event, data):
+        stats = {"redis_time": 0.0, "redis_calls": 0, "api_time": 0.0, "api_calls": 0}
+        stats_token = current_update.set(stats)
+        label_token = handler_label.set(None)
+        profiler = None
+        if slow_updates.should_profile():
+            slow_updates.profiling = True
+            profiler = cProfile.Profile()
+            profiler.enable()
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            handler_errors.inc(self._name(data))
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            if profiler:
+                profiler.disable()
+                slow_updates.profiling = False
+            name = self._name(data)
+            handler_latency.observe(name, value=duration)
+            entry = dict(stats, handler=name, duration=duration, at=time.time())
+            if profiler:
+                out = io.StringIO()
+                pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(15)
+                entry["profile"] = out.getvalue()
+            slow_updates.record(entry)
+            handler_label.reset(label_token)
+            current_update.reset(stats_token)
+
+    @staticmethod
+    def _name(data):
+        label = handler_label.get()
+        if label:
+            return label
+        handler = data.get("handler")
+        return getattr(getattr(handler, "callback", None), "__name__", "unknown")
+
+async def metrics_view(request):
+    return web.Response(text=await registry.render(), content_type="text/plain", charset="utf-8")
+
+async def slow_updates_view(request):
+    return web.json_response(slow_updates.dump())
+
+def add_routes(app):
+    app.router.add_get("/metrics", metrics_view)
+    app.router.add_get("/debug/slow", slow_updates_view)
+
+async def serve(host, port):
+    """Отдельный HTTP-сервер метрик и отладки.
+
+    Во всех режимах, включая webhook: публичный слушатель апдейтов
+    /metrics и /debug/slow не отдаёт.
+    """
+    app = web.Application()
+    add_routes(app)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -0,0 +1,67 @@
+import time
+from collections import defaultdict
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.client.telegram import PRODUCTION, TelegramAPIServer
+
+from config import config
+import metrics
+
+class LatencyStats:
+    """Счётчики задержек вызовов Bot API по методам"""
+    def __init__(self):
+        self.calls = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.total = defaultdict(float)
+        self.max = defaultdict(float)
+
+    def observe(self, method, elapsed, ok=True):
+        self.calls[method] += 1
+        self.total[method] += elapsed
+        self.max[method] = max(self.max[method], elapsed)
+        if not ok:
+            self.errors[method] += 1
+
+    def snapshot(self):
+        return {
+            method: {
+                "calls": calls,
+                "errors": self.errors[method],
+                "avg_ms": self.total[method] / calls * 1000,
+                "max_ms": self.max[method] * 1000,
+            }
+            for method, calls in self.calls.items()
+        }
+
+class LatencyMiddleware(BaseRequestMiddleware):
+    """Замер времени каждого запроса к Bot API"""
+    def __init__(self, stats):
+        self.stats = stats
+
+    async def __call__(self, make_request, bot, method):
+        start = time.perf_counter()
+        ok = False
+        try:
+            response = await make_request(bot, method)
+            ok = True
+            return response
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stats.observe(type(method).__name__, elapsed, ok)
+            metrics.observe_api(type(method).__name__, elapsed, ok)
+
+stats = LatencyStats()
+
+# Одна keep-alive сессия на все исходящие вызовы: публикации, рассылки, уведомления
+# TELEGRAM_API_URL — локальный Bot API сервер или фейковый API из benchmarks
+api = TelegramAPIServer.from_base(config.telegram_api_url) if config.telegram_api_url else PRODUCTION
+session = AiohttpSession(api=api, limit=config.bot_connections_limit)
+session.middleware(LatencyMiddleware(stats))
+
+bot = Bot(token=config.bot_token, session=session)
+
+async def close():
+    """Закрытие HTTP-сессии при остановке бота"""
+    await bot.session.close()
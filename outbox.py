@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import random
+import time
+
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+
+from config import config
+from scheduler import DelayedWorker, Scheduler
+from utils import publish_to_channel, notify_organizer, notify_organizers, run_in_background
+import media
+
+logger = logging.getLogger(__name__)
+
+OUTBOX = "publish_outbox"
+INFLIGHT = "publish_inflight"
+LEASE_SECONDS = 120
+# Окончательно неудавшиеся публикации возвращаются на модерацию
+FAILED_SET = "pending_events"
+BASE_DELAY = 2
+MAX_DELAY = 600
+MAX_ATTEMPTS = 10
+
+class Outbox(DelayedWorker):
+    """Очередь публикаций в канал с повторами.
+
+    Мероприятие лежит в publish_outbox со временем следующей попытки и
+    попадает в published_events только после ответа Telegram; message_id
+    поста сохраняется в хеше мероприятия. Пока идёт отправка, аренда в
+    publish_inflight продлевается: ожидание лимитов её не переживёт.
+    """
+    queue = OUTBOX
+    inflight = INFLIGHT
+    wakeup_channel = "outbox:wakeup"
+
+    async def enqueue(self, event_id, admin_id=None, from_set="pending_events"):
+        """Постановка в очередь; False, если мероприятие уже обработано"""
+        if not await self.db.move_event(event_id, from_set, OUTBOX):
+            return False
+        job = {"attempts": 0, "from_set": from_set}
+        if admin_id:
+            job["admin_id"] = admin_id
+        await self.db.redis.hset(f"outbox:{event_id}", mapping=job)
+        await self.notify(event_id)
+        return True
+
+    async def enqueue_many(self, event_ids, from_set="pending_events"):
+        """Пакетная постановка в очередь; возвращает поставленные id.
+
+        Без admin_id: администратор уже видит число поставленных, а отчёт
+        о каждой публикации завалил бы его чат.
+        """
+        moved = await self.db.move_events(event_ids, from_set, OUTBOX)
+        if not moved:
+            return []
+        job = {"attempts": 0, "from_set": from_set}
+        async with self.db.redis.pipeline(transaction=False) as pipe:
+            for event_id in moved:
+                pipe.hset(f"outbox:{event_id}", mapping=job)
+            await pipe.execute()
+        await self.notify()
+        return moved
+
+    async def fire_next(self):
+        now = time.time()
+        event_id = await self.claim(keys=[OUTBOX, INFLIGHT], args=[now, now + LEASE_SECONDS])
+        if event_id is None:
+            return False
+
+        event = await self.db.get_event(event_id)
+        if not event:
+            await self._finish(event_id, None)
+            return True
+        try:
+            # message_id уже есть — пост отправлен, но процесс упал до подтверждения
+            if not event.get('message_id'):
+                album = await self.db.get_media(event_id) if media.is_album(event) else None
+                keeper = asyncio.create_task(self._keep_lease(event_id))
+                try:
+                    message_id = await publish_to_channel(event_id, event, album)
+                finally:
+                    keeper.cancel()
+                await self.db.redis.hset(f"event:{event_id}", "message_id", message_id)
+        except TelegramRetryAfter as e:
+            await self._retry(event_id, e.retry_after, e)
+        except (TelegramBadRequest, TelegramForbiddenError) as e:
+            await self._give_up(event_id, e)
+        except Exception as e:
+            attempts = await self.db.redis.hincrby(f"outbox:{event_id}", "attempts", 1)
+            if attempts >= MAX_ATTEMPTS:
+                await self._give_up(event_id, e)
+            else:
+                delay = min(MAX_DELAY, BASE_DELAY * 2 ** attempts) * random.uniform(0.5, 1)
+                await self._retry(event_id, delay, e)
+        else:
+            admin_id = await self._finish(event_id, "published_events")
+            if event.get('organizer_id'):
+                run_in_background(notify_organizer(event['organizer_id'], "✅ Ваше мероприятие было опубликовано!"))
+            if admin_id:
+                run_in_background(notify_organizer(admin_id, f"✅ Мероприятие #{event_id} опубликовано в канале"))
+        return True
+
+    async def _keep_lease(self, event_id):
+        """Продление аренды, пока публикация ждёт лимитов или ответа Telegram"""
+        while True:
+            await asyncio.sleep(LEASE_SECONDS / 3)
+            await self.db.redis.zadd(INFLIGHT, {event_id: time.time() + LEASE_SECONDS}, xx=True)
+
+    async def _retry(self, event_id, delay, error):
+        logger.warning(f"Publishing event {event_id} failed ({error}), retry in {delay:.0f}s")
+        await self.db.move_event(event_id, INFLIGHT, OUTBOX, score=time.time() + delay)
+
+    async def _give_up(self, event_id, error):
+        """Окончательная ошибка: мероприятие возвращается на модерацию.
+
+        Не в исходный набор: из scheduled_events с прошедшим сроком оно
+        тут же снова попало бы в очередь. Предупреждение получают все
+        администраторы — решение по мероприятию снова за ними, — и тот,
+        кто его публиковал, даже если его уже нет в ADMIN_IDS.
+        """
+        logger.error(f"Publishing event {event_id} failed permanently: {error}")
+        admin_id = await self._finish(event_id, FAILED_SET)
+        recipients = set(config.admin_ids) | ({int(admin_id)} if admin_id else set())
+        run_in_background(notify_organizers(
+            recipients,
+            f"⚠ Не удалось опубликовать мероприятие #{event_id}, оно возвращено на модерацию: {error}"
+        ))
+
+    async def _finish(self, event_id, to_set):
+        """Снятие задания; id администратора, поставившего его, или None"""
+        if to_set:
+            await self.db.move_event(event_id, INFLIGHT, to_set)
+        else:
+            await self.db.redis.zrem(INFLIGHT, event_id)
+        async with self.db.redis.pipeline(transaction=True) as pipe:
+            pipe.hget(f"outbox:{event_id}", "admin_id")
+            pipe.delete(f"outbox:{event_id}")
+            admin_id, _ = await pipe.execute()
+        return admin_id
+
+outbox = Outbox()
+scheduler = Scheduler(outbox)
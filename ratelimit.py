@@ -0,0 +1,89 @@
+import asyncio
+import logging
+import time
+
+from aiogram.exceptions import TelegramRetryAfter
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не больше capacity подряд"""
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def pause(self, seconds):
+        """Запрет выдачи токенов на время retry_after"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class TelegramLimiter:
+    """Общий и початовый лимиты Telegram с повтором после retry_after.
+
+    chat_rates — чаты со своим лимитом (канал публикаций), остальные
+    получают per_chat_rate.
+    """
+    def __init__(self, global_rate, per_chat_rate, chat_rates=None, max_retries=3, max_chats=10000):
+        self.global_bucket = TokenBucket(global_rate)
+        self.per_chat_rate = per_chat_rate
+        self.chat_rates = chat_rates or {}
+        self.max_retries = max_retries
+        self.max_chats = max_chats
+        self.chats = {}
+
+    def chat_bucket(self, chat_id):
+        bucket = self.chats.get(chat_id)
+        if bucket is None:
+            if len(self.chats) >= self.max_chats:
+                # Простаивающие вёдра полны — их можно пересоздать без потери лимита
+                now = time.monotonic()
+                self.chats = {
+                    cid: b for cid, b in self.chats.items()
+                    if (now - b.updated) * b.rate < b.capacity or b.paused_until > now
+                }
+            bucket = self.chats[chat_id] = TokenBucket(self.chat_rates.get(chat_id, self.per_chat_rate))
+        return bucket
+
+    async def call(self, chat_id, make_call, retries=None):
+        """Выполнение make_call() в пределах лимитов; 429 ждём и повторяем.
+
+        retries=0 — без повторов: вызывающий, у которого своё расписание
+        попыток, получает TelegramRetryAfter сразу, а ведро чата всё равно
+        ставится на паузу.
+        """
+        retries = self.max_retries if retries is None else retries
+        bucket = self.chat_bucket(chat_id)
+        for attempt in range(retries + 1):
+            await bucket.acquire()
+            await self.global_bucket.acquire()
+            try:
+                return await make_call()
+            except TelegramRetryAfter as e:
+                logger.warning(f"Flood control for chat {chat_id}, retry after {e.retry_after}s")
+                bucket.pause(e.retry_after)
+                if attempt == retries:
+                    raise
+
+limiter = TelegramLimiter(
+    config.rate_limit_global,
+    config.rate_limit_per_chat,
+    chat_rates={config.channel_id: config.rate_limit_channel / 60}
+)
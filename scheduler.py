@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import time
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+SCHEDULED = "scheduled_events"
+MAX_SLEEP = 300
+# Пауза после ошибки итерации (Redis недоступен и т.п.), удваивается до предела
+ERROR_BACKOFF = 1
+MAX_ERROR_BACKOFF = 60
+
+# Забираем одно наступившее мероприятие в "в работе" с арендой;
+# ZREM атомарен, поэтому из нескольких реплик его получит только одна
+CLAIM_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, 1)
+if #due == 0 then return false end
+redis.call('ZREM', KEYS[1], due[1])
+redis.call('ZADD', KEYS[2], ARGV[2], due[1])
+return due[1]
+"""
+
+# Возврат в очередь мероприятий, чья аренда истекла (упавшая реплика)
+REQUEUE_SCRIPT = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1])
+for _, event_id in ipairs(expired) do
+    redis.call('ZREM', KEYS[2], event_id)
+    redis.call('ZADD', KEYS[1], ARGV[1], event_id)
+end
+return #expired
+"""
+
+class DelayedWorker:
+    """Обработка sorted set'а сроков: сон до ближайшего срока, а не опрос.
+
+    Наследник задаёт queue (и при необходимости inflight) и fire_next().
+    Другие реплики будят обработчик через pub/sub-канал wakeup_channel.
+    """
+    queue = None
+    inflight = None
+    wakeup_channel = None
+
+    def __init__(self, database=db):
+        self.db = database
+        self.claim = database.redis.register_script(CLAIM_SCRIPT)
+        self.requeue = database.redis.register_script(REQUEUE_SCRIPT)
+        self.wakeup = asyncio.Event()
+        self.running = False
+
+    async def notify(self, payload=""):
+        """Пробуждение обработчиков во всех репликах"""
+        await self.db.redis.publish(self.wakeup_channel, payload)
+        self.wakeup.set()
+
+    async def run(self):
+        self.running = True
+        listener = asyncio.create_task(self._listen())
+        backoff = ERROR_BACKOFF
+        try:
+            while self.running:
+                try:
+                    if self.inflight:
+                        await self.requeue(keys=[self.queue, self.inflight], args=[time.time()])
+                    while self.running and await self.fire_next():
+                        pass
+                    await self._sleep()
+                    backoff = ERROR_BACKOFF
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    logger.exception(f"{type(self).__name__} iteration failed, retry in {backoff}s")
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, MAX_ERROR_BACKOFF)
+        finally:
+            listener.cancel()
+
+    def stop(self):
+        self.running = False
+        self.wakeup.set()
+
+    async def fire_next(self):
+        """Обработка одного наступившего элемента; False, если таких нет"""
+        raise NotImplementedError
+
+    async def _listen(self):
+        """Пробуждение по сообщениям других реплик; переподключение после ошибок"""
+        while True:
+            try:
+                async with self.db.redis.pubsub() as pubsub:
+                    await pubsub.subscribe(self.wakeup_channel)
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self.wakeup.set()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Wakeup listener {self.wakeup_channel} failed: {e!r}")
+                await asyncio.sleep(ERROR_BACKOFF * 5)
+
+    async def _sleep(self):
+        """Сон до ближайшего срока или истечения аренды"""
+        # Сброс до чтения сроков: пробуждение во время чтения не потеряется
+        self.wakeup.clear()
+        deadlines = [time.time() + MAX_SLEEP]
+        for key in filter(None, (self.queue, self.inflight)):
+            nearest = await self.db.redis.zrange(key, 0, 0, withscores=True)
+            if nearest:
+                deadlines.append(nearest[0][1])
+        timeout = max(0.0, min(deadlines) - time.time())
+        try:
+            await asyncio.wait_for(self.wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+class Scheduler(DelayedWorker):
+    """Отложенная публикация: в срок мероприятие уходит в очередь публикации"""
+    queue = SCHEDULED
+    wakeup_channel = "scheduler:wakeup"
+
+    def __init__(self, outbox, database=db):
+        super().__init__(database)
+        self.outbox = outbox
+
+    async def schedule(self, event_id, publish_at):
+        """Перевод мероприятия из очереди модерации в отложенные"""
+        if not await self.db.move_event(event_id, "pending_events", SCHEDULED, score=publish_at.timestamp()):
+            return False
+        await self.notify(event_id)
+        return True
+
+    async def schedule_many(self, event_ids, publish_at):
+        """Пакетный перевод в отложенные; возвращает перенесённые id"""
+        moved = await self.db.move_events(event_ids, "pending_events", SCHEDULED, score=publish_at.timestamp())
+        if moved:
+            await self.notify()
+        return moved
+
+    async def fire_next(self):
+        due = await self.db.redis.zrangebyscore(SCHEDULED, "-inf", time.time(), start=0, num=1)
+        if not due:
+            return False
+        # Перенос атомарен: из нескольких реплик мероприятие заберёт одна.
+        # Хранится только id, поэтому опубликуется актуальная версия
+        if await self.outbox.enqueue(due[0], from_set=SCHEDULED):
+            logger.info(f"Scheduled event {due[0]} moved to the publish outbox")
+        return True
@@ -0,0 +1,145 @@
+import hashlib
+import re
+from dataclasses import dataclass, astuple
+from datetime import datetime, timedelta
+
+import pytz
+
+from config import config
+
+# Вторичные индексы мероприятий:
+#   idx:token:{токен}     — SET id мероприятий со словом в названии или описании
+#   idx:organizer:{id}    — SET id мероприятий организатора
+#   idx:date, idx:price   — ZSET, score = время начала / стоимость
+# Статус отдельно не индексируется: статусные sorted set'ы пересекаются напрямую
+DATE_INDEX = "idx:date"
+PRICE_INDEX = "idx:price"
+INDEXED_FIELDS = ("title", "description", "date_obj", "price", "organizer_id")
+
+TOKEN_RE = re.compile(r"\w+")
+# Грубая нормализация словоформ: «концерт», «концерта», «концерты» — один токен
+TOKEN_PREFIX = 7
+MIN_TOKEN = 2
+
+STATUS_ALIASES = {
+    "pending": "pending_events", "модерация": "pending_events",
+    "published": "published_events", "опубликовано": "published_events",
+    "rejected": "rejected_events", "отклонено": "rejected_events",
+    "scheduled": "scheduled_events", "отложено": "scheduled_events",
+}
+
+def tokenize(*texts):
+    tokens = set()
+    for text in texts:
+        for word in TOKEN_RE.findall((text or "").lower().replace("ё", "е")):
+            if len(word) >= MIN_TOKEN:
+                tokens.add(word[:TOKEN_PREFIX])
+    return tokens
+
+def token_key(token):
+    return f"idx:token:{token}"
+
+def organizer_key(organizer_id):
+    return f"idx:organizer:{organizer_id}"
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _date_score(value):
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+def add_to_index(pipe, event_id, event):
+    """Команды индексации мероприятия в пайплайн"""
+    for token in tokenize(event.get('title'), event.get('description')):
+        pipe.sadd(token_key(token), event_id)
+    date = _date_score(event.get('date_obj'))
+    if date is not None:
+        pipe.zadd(DATE_INDEX, {event_id: date})
+    price = _number(event.get('price'))
+    if price is not None:
+        pipe.zadd(PRICE_INDEX, {event_id: price})
+    if event.get('organizer_id'):
+        pipe.sadd(organizer_key(event['organizer_id']), event_id)
+
+def remove_from_index(pipe, event_id, event):
+    """Команды удаления мероприятия из индексов по его прежним значениям"""
+    for token in tokenize(event.get('title'), event.get('description')):
+        pipe.srem(token_key(token), event_id)
+    pipe.zrem(DATE_INDEX, event_id)
+    pipe.zrem(PRICE_INDEX, event_id)
+    if event.get('organizer_id'):
+        pipe.srem(organizer_key(event['organizer_id']), event_id)
+
+@dataclass(frozen=True)
+class Query:
+    tokens: tuple = ()
+    date_from: float = None
+    date_to: float = None
+    price_min: float = None
+    price_max: float = None
+    status_set: str = None
+    organizer_id: int = None
+
+    @property
+    def result_key(self):
+        """Ключ кэша выборки: листание страниц не пересчитывает пересечение"""
+        digest = hashlib.sha1(repr(astuple(self)).encode()).hexdigest()[:16]
+        return f"tmp:search:{digest}"
+
+def _day(value, tz):
+    return tz.localize(datetime.strptime(value, '%d.%m.%Y'))
+
+def _parse_dates(value, now):
+    """«ДД.ММ.ГГГГ», «ДД.ММ.ГГГГ-ДД.ММ.ГГГГ» или «выходные» (ближайшие сб–вс)"""
+    tz = pytz.timezone(config.timezone)
+    if value == "выходные":
+        today = now.astimezone(tz).replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+        saturday = tz.localize(today + timedelta(days=(5 - today.weekday()) % 7))
+        if today.weekday() == 6:
+            saturday = tz.localize(today - timedelta(days=1))
+        return saturday.timestamp(), (saturday + timedelta(days=2)).timestamp()
+    start, _, end = value.partition("-")
+    start = _day(start, tz)
+    end = _day(end, tz) if end else start
+    return start.timestamp(), (end + timedelta(days=1)).timestamp()
+
+def _parse_range(value):
+    """«500» — ровно, «-500» — не дороже, «100-500» — от и до"""
+    low, sep, high = value.partition("-")
+    if not sep:
+        return float(low), float(low)
+    return float(low) if low else None, float(high) if high else None
+
+def parse_query(text, now=None):
+    """Запрос /search: слова и фильтры дата:, цена:, статус:, организатор:.
+
+    Пример: «концерт дата:выходные цена:0 статус:published».
+    ValueError для некорректного фильтра.
+    """
+    filters = {}
+    words = []
+    for part in (text or "").split():
+        key, sep, value = part.partition(":")
+        if not sep or not value:
+            words.append(part)
+            continue
+        key = key.lower()
+        if key in ("дата", "date"):
+            filters["date_from"], filters["date_to"] = _parse_dates(value.lower(), now or datetime.now(pytz.utc))
+        elif key in ("цена", "price"):
+            filters["price_min"], filters["price_max"] = _parse_range(value)
+        elif key in ("статус", "status"):
+            if value.lower() not in STATUS_ALIASES:
+                raise ValueError(f"Unknown status: {value}")
+            filters["status_set"] = STATUS_ALIASES[value.lower()]
+        elif key in ("организатор", "organizer"):
+            filters["organizer_id"] = int(value)
+        else:
+            words.append(part)
+    return Query(tokens=tuple(sorted(tokenize(*words))), **filters)
@@ -0,0 +1,224 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+
+from aiogram.types import Update
+from redis.exceptions import ResponseError
+
+import metrics
+from config import config
+from database import db
+from webhook import update_user_id
+
+logger = logging.getLogger(__name__)
+
+GROUP = "bot"
+LEASE_SECONDS = 30
+# Владелец продлевает аренду каждые LEASE_SECONDS / 3 секунд
+HEARTBEAT_SECONDS = LEASE_SECONDS / 3
+# Записи упавшего владельца забираются не позже, чем истекает его аренда
+RECLAIM_IDLE_MS = LEASE_SECONDS * 1000
+READ_COUNT = 20
+BLOCK_MS = 5000
+LAG_REPORT_INTERVAL = 60
+INGEST_BACKOFF_MAX = 60
+
+def stream_key(shard):
+    return f"updates:{shard}"
+
+async def publish_update(data):
+    """Запись апдейта в поток его шарда; порядок внутри пользователя сохраняется"""
+    shard = update_user_id(data) % config.stream_shards
+    await db.redis.xadd(
+        stream_key(shard),
+        {"update": json.dumps(data, ensure_ascii=False)},
+        maxlen=config.stream_maxlen,
+        approximate=True
+    )
+
+async def shard_lag(shards=None):
+    """Отставание и число неподтверждённых записей по шардам"""
+    stats = {}
+    for shard in range(config.stream_shards) if shards is None else shards:
+        try:
+            groups = await db.redis.xinfo_groups(stream_key(shard))
+        except ResponseError:
+            continue
+        for group in groups:
+            if group["name"] == GROUP:
+                stats[shard] = {"lag": group.get("lag"), "pending": group["pending"]}
+    return stats
+
+class ShardWorker:
+    """Обработка своих шардов: один владелец на шард, апдейты строго по порядку.
+
+    Владение шардом — ключ-аренда в Redis, её продлевает отдельная задача;
+    если продлить не удалось, обработка шарда останавливается до следующей
+    записи. Получив аренду, новый владелец сразу забирает через XAUTOCLAIM
+    все неподтверждённые записи группы: имя потребителя включает pid, так что
+    чужой PEL через XREADGROUP с id "0" не прочитать. Перед каждым чтением
+    новых записей забираются и те, что зависли дольше RECLAIM_IDLE_MS.
+    """
+    def __init__(self, dp, bot, shards):
+        self.dp = dp
+        self.bot = bot
+        self.shards = shards
+        self.consumer = f"{socket.gethostname()}:{os.getpid()}"
+        self.running = True
+        metrics.registry.add_collector(self.collect_lag)
+
+    async def run(self):
+        tasks = [asyncio.create_task(self.run_shard(shard)) for shard in self.shards]
+        tasks.append(asyncio.create_task(self.report_lag()))
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stop(self):
+        self.running = False
+
+    async def run_shard(self, shard):
+        stream = stream_key(shard)
+        lease = f"{stream}:owner"
+        try:
+            await db.redis.xgroup_create(stream, GROUP, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+        while self.running:
+            if not await db.redis.set(lease, self.consumer, nx=True, ex=LEASE_SECONDS):
+                await asyncio.sleep(LEASE_SECONDS / 3)
+                continue
+            logger.info(f"Consumer {self.consumer} owns shard {shard}")
+            owned = asyncio.Event()
+            owned.set()
+            heartbeat = asyncio.create_task(self.heartbeat(lease, owned))
+            try:
+                await self.consume(stream, owned)
+            finally:
+                heartbeat.cancel()
+                await db.release_lease(lease, self.consumer)
+
+    async def heartbeat(self, lease, owned):
+        """Продление аренды независимо от того, сколько идёт обработка апдейта"""
+        while owned.is_set():
+            await asyncio.sleep(HEARTBEAT_SECONDS)
+            try:
+                renewed = await db.renew_lease(lease, self.consumer, LEASE_SECONDS)
+            except Exception as e:
+                logger.error(f"Cannot renew lease {lease}: {e!r}")
+                renewed = False
+            if not renewed:
+                logger.warning(f"Lost lease {lease}")
+                owned.clear()
+
+    async def reclaim(self, stream, owned, min_idle=RECLAIM_IDLE_MS):
+        """Записи, зависшие у прежнего владельца дольше min_idle миллисекунд"""
+        start = "0-0"
+        while owned.is_set():
+            # Redis 7 добавляет третий элемент — удалённые id, он нам не нужен
+            reply = await db.redis.xautoclaim(
+                stream, GROUP, self.consumer, min_idle, start_id=start, count=READ_COUNT
+            )
+            start, entries = reply[0], reply[1]
+            await self.process(stream, entries, owned)
+            if start == "0-0":
+                break
+
+    async def consume(self, stream, owned):
+        # Аренда наша, значит прежний владелец шард уже не обрабатывает:
+        # его неподтверждённые записи забираем сразу, не дожидаясь простоя
+        await self.reclaim(stream, owned, min_idle=0)
+        while self.running and owned.is_set():
+            await self.reclaim(stream, owned)
+            response = await db.redis.xreadgroup(
+                GROUP, self.consumer, {stream: ">"}, count=READ_COUNT, block=BLOCK_MS
+            )
+            entries = response[0][1] if response else []
+            await self.process(stream, entries, owned)
+
+    async def process(self, stream, entries, owned):
+        for entry_id, fields in entries:
+            if not owned.is_set():
+                # Шард уже у другого владельца: неподтверждённые записи он заберёт сам
+                return
+            if not fields:
+                # Запись удалена обрезкой потока, остался только id в PEL
+                await db.redis.xack(stream, GROUP, entry_id)
+                continue
+            data = json.loads(fields["update"])
+            try:
+                update = Update.model_validate(data, context={"bot": self.bot})
+                await self.dp.feed_update(self.bot, update)
+            except Exception:
+                logger.exception(f"Error processing update {data.get('update_id')} from {stream}")
+            await db.redis.xack(stream, GROUP, entry_id)
+
+    async def collect_lag(self):
+        """Отставание своих шардов на момент запроса /metrics"""
+        for shard, stats in (await shard_lag(self.shards)).items():
+            # lag неизвестен (None), если из потока удаляли записи
+            if stats["lag"] is not None:
+                metrics.stream_lag.set(shard, "lag", value=stats["lag"])
+            metrics.stream_lag.set(shard, "pending", value=stats["pending"])
+
+    async def report_lag(self):
+        while self.running:
+            await asyncio.sleep(LAG_REPORT_INTERVAL)
+            logger.info(f"Stream lag by shard: {await shard_lag()}")
+
+async def ingest_polling(bot):
+    """Long polling без обработки: апдейты только раскладываются по шардам.
+
+    offset хранится в Redis, поэтому после перезапуска накопившиеся
+    апдейты дочитываются, а не выбрасываются.
+    """
+    offset = None
+    backoff = 1
+    while True:
+        try:
+            if offset is None:
+                offset = int(await db.redis.get("updates:offset") or 0)
+            updates = await bot.get_updates(offset=offset, timeout=30)
+            for update in updates:
+                await publish_update(update.model_dump(mode="json", exclude_none=True, by_alias=True))
+                offset = update.update_id + 1
+                await db.redis.set("updates:offset", offset)
+            backoff = 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Сеть, Bot API или Redis: апдейты остаются у Telegram, повторяем с того же offset
+            logger.error(f"Update ingest failed, retrying in {backoff}s: {e!r}")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, INGEST_BACKOFF_MAX)
+
+def run_stream_ingest(dp, bot, on_startup, on_shutdown):
+    """Запуск приёма апдейтов через long polling в режиме потоков"""
+    async def main():
+        await bot.delete_webhook(drop_pending_updates=False)
+        await on_startup(dp)
+        try:
+            await ingest_polling(bot)
+        finally:
+            await on_shutdown(dp)
+
+    asyncio.run(main())
+
+def run_stream_worker(dp, bot, shards, on_startup, on_shutdown):
+    """Запуск процесса-обработчика для указанных шардов"""
+    async def main():
+        worker = ShardWorker(dp, bot, shards)
+        await on_startup(dp)
+        try:
+            await worker.run()
+        finally:
+            worker.stop()
+            await on_shutdown(dp)
+
+    asyncio.run(main())
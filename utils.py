@@ -1,8 +1,20 @@
 from config import config
-from aiogram import Bot
+from outbound import bot
+from ratelimit import limiter
+from keyboards import get_event_management_keyboard, get_edit_keyboard
+import media
+from collections import OrderedDict
 from datetime import datetime
+from html import escape
+import asyncio
+import logging
 import pytz
 
+logger = logging.getLogger(__name__)
+
+# Ссылки на фоновые задачи, чтобы их не собрал сборщик мусора
+background_tasks = set()
+
 def validate_date(date_str):
     """Проверка формата даты"""
     try:
@@ -14,51 +26,146 @@ def validate_date(date_str):
 
 def format_event(event):
     """Форматирование мероприятия в текст"""
+    # Пользовательский ввод экранируется, иначе он ломает HTML-разметку
+    e = {key: escape(str(event.get(key, ''))) for key in (
+        'title', 'description', 'date', 'address', 'price', 'link', 'organizer'
+    )}
     return (
-        f"📌 <b>{event['title']}</b>\n\n"
-        f"📝 <i>{event['description']}</i>\n\n"
-        f"📅 <b>Дата:</b> {event['date']}\n"
-        f"📍 <b>Адрес:</b> {event['address']}\n"
-        f"💰 <b>Стоимость:</b> {event['price']} руб.\n"
-        f"🔗 <b>Ссылка:</b> {event['link']}\n\n"
-        f"Организатор: @{event['organizer']}"
+        f"📌 <b>{e['title']}</b>\n\n"
+        f"📝 <i>{e['description']}</i>\n\n"
+        f"📅 <b>Дата:</b> {e['date']}\n"
+        f"📍 <b>Адрес:</b> {e['address']}\n"
+        f"💰 <b>Стоимость:</b> {e['price']} руб.\n"
+        f"🔗 <b>Ссылка:</b> {e['link']}\n\n"
+        f"Организатор: @{e['organizer']}"
     )
 
-async def publish_to_channel(event_id, event):
-    """Публикация мероприятия в канал"""
-    try:
-        bot = Bot(token=config.bot_token)
-        if event.get('photo'):
-            await bot.send_photo(
-                chat_id=config.channel_id,
-                photo=event['photo'],
-                caption=format_event(event),
-                parse_mode='HTML'
-            )
-        else:
-            await bot.send_message(
-                chat_id=config.channel_id,
-                text=format_event(event),
-                parse_mode='HTML'
-            )
-        return True
-    except Exception as e:
-        print(f"Ошибка публикации: {e}")
-        return False
-    finally:
-        await bot.close()
+class RenderCache:
+    """LRU-кэш карточек мероприятий по ключу (id, ревизия)"""
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, key, build):
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            value = self.entries[key] = build()
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+            return value
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return value
+
+    def card(self, event_id, event):
+        """Текст и клавиатура управления мероприятием"""
+        key = ("card", str(event_id), str(event.get('rev', 0)))
+        return self._lookup(key, lambda: (format_event(event), get_event_management_keyboard(event_id)))
+
+    def text(self, event_id, event):
+        return self.card(event_id, event)[0]
+
+    def edit_keyboard(self, event_id):
+        return self._lookup(("edit", str(event_id)), lambda: get_edit_keyboard(event_id))
+
+    def invalidate(self, event_id):
+        """Удаление устаревших ревизий карточки после изменения мероприятия"""
+        event_id = str(event_id)
+        for key in [key for key in self.entries if key[0] == "card" and key[1] == event_id]:
+            del self.entries[key]
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.entries)}
+
+render_cache = RenderCache(config.render_cache_size)
+
+async def publish_to_channel(event_id, event, album=None):
+    """Публикация мероприятия в канал; возвращает message_id поста.
+
+    album — записи реестра медиа, если фото несколько: тогда пост уходит
+    одним sendMediaGroup. Посты в канал идут через limiter, поэтому
+    массовая публикация не упирается в flood control. Ошибки Telegram,
+    включая retry_after, пробрасываются сразу: повторами занимается outbox,
+    и ожидание не должно пережить его аренду.
+    """
+    if album and len(album) > 1:
+        messages = await limiter.call(config.channel_id, lambda: bot.send_media_group(
+            chat_id=config.channel_id,
+            media=media.album(album, render_cache.text(event_id, event))
+        ), retries=0)
+        return messages[0].message_id
+    if event.get('photo'):
+        message = await limiter.call(config.channel_id, lambda: bot.send_photo(
+            chat_id=config.channel_id,
+            photo=event['photo'],
+            caption=render_cache.text(event_id, event),
+            parse_mode='HTML'
+        ), retries=0)
+    else:
+        message = await limiter.call(config.channel_id, lambda: bot.send_message(
+            chat_id=config.channel_id,
+            text=render_cache.text(event_id, event),
+            parse_mode='HTML'
+        ), retries=0)
+    return message.message_id
 
 async def notify_organizer(organizer_id, message):
     """Уведомление организатора"""
     try:
-        bot = Bot(token=config.bot_token)
-        await bot.send_message(
+        await limiter.call(organizer_id, lambda: bot.send_message(
             chat_id=organizer_id,
             text=message
-        )
+        ))
         return True
     except Exception as e:
-        print(f"Ошибка уведомления организатора: {e}")
+        logger.error(f"Error notifying organizer {organizer_id}: {e}")
         return False
-    finally:
-        await bot.close()
\ No newline at end of file
+
+async def notify_organizers(organizer_ids, message):
+    """Одно уведомление многим организаторам в пределах лимитов; число доставленных"""
+    results = await asyncio.gather(*(notify_organizer(organizer_id, message) for organizer_id in organizer_ids))
+    return sum(results)
+
+def run_in_background(coro):
+    """Запуск корутины вне обработчика апдейта"""
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(_on_background_done)
+    return task
+
+def _on_background_done(task):
+    background_tasks.discard(task)
+    if not task.cancelled() and task.exception():
+        logger.error(f"Background task failed: {task.exception()!r}")
+
+async def send_event_to_admins(event_id, event):
+    """Параллельная рассылка мероприятия администраторам в пределах лимитов"""
+    text, markup = render_cache.card(event_id, event)
+
+    async def send(admin_id):
+        try:
+            if event.get('photo'):
+                await limiter.call(admin_id, lambda: bot.send_photo(
+                    chat_id=admin_id,
+                    photo=media.preview_photo(event),
+                    caption=text,
+                    reply_markup=markup,
+                    parse_mode='HTML'
+                ))
+            else:
+                await limiter.call(admin_id, lambda: bot.send_message(
+                    chat_id=admin_id,
+                    text=text,
+                    reply_markup=markup,
+                    parse_mode='HTML'
+                ))
+            return True
+        except Exception as e:
+            logger.error(f"Error sending event to admin {admin_id}: {e}")
+            return False
+
+    results = await asyncio.gather(*(send(admin_id) for admin_id in config.admin_ids))
+    return sum(results)
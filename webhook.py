@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import secrets
+
+from aiohttp import web
+from aiogram.types import Update
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+DRAIN_TIMEOUT = 30
+
+def update_user_id(data):
+    """id пользователя из сырого апдейта — ключ партиционирования"""
+    for kind in ("message", "edited_message", "callback_query", "inline_query", "my_chat_member"):
+        sender = data.get(kind, {}).get("from")
+        if sender:
+            return sender["id"]
+    return data.get("update_id", 0)
+
+class WebhookServer:
+    """Приём апдейтов от Telegram: ответ сразу, обработка из очередей.
+
+    Очередей по числу обработчиков; апдейты одного пользователя всегда
+    попадают в одну очередь, поэтому шаги его FSM не перемешиваются.
+    """
+    def __init__(self, dp, bot, secret, workers, queue_size, sink=None):
+        self.dp = dp
+        self.bot = bot
+        self.secret = secret
+        # sink — внешний приёмник апдейтов (потоки Redis) вместо локальных очередей
+        self.sink = sink
+        self.queues = [asyncio.Queue(maxsize=queue_size) for _ in range(workers)]
+        self.workers = []
+
+    async def handle(self, request):
+        if not secrets.compare_digest(request.headers.get(SECRET_HEADER, ""), self.secret):
+            return web.Response(status=401)
+        try:
+            data = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+        if self.sink:
+            await self.sink(data)
+            return web.Response()
+        queue = self.queues[update_user_id(data) % len(self.queues)]
+        try:
+            queue.put_nowait(data)
+        except asyncio.QueueFull:
+            # Telegram повторит доставку позже — апдейт не теряется
+            return web.Response(status=503)
+        return web.Response()
+
+    async def worker(self, queue):
+        while True:
+            data = await queue.get()
+            try:
+                update = Update.model_validate(data, context={"bot": self.bot})
+                await self.dp.feed_update(self.bot, update)
+            except Exception:
+                logger.exception(f"Error processing update {data.get('update_id')}")
+            finally:
+                queue.task_done()
+
+    async def start(self, app):
+        self.workers = [asyncio.create_task(self.worker(queue)) for queue in self.queues]
+
+    async def drain(self, app):
+        """Дообработка принятых апдейтов при остановке"""
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(queue.join() for queue in self.queues)),
+                DRAIN_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            logger.warning(f"Webhook drain timed out, {sum(q.qsize() for q in self.queues)} updates left")
+        for task in self.workers:
+            task.cancel()
+
+    def app(self):
+        app = web.Application()
+        app.router.add_post(config.webhook_path, self.handle)
+        app.on_startup.append(self.start)
+        app.on_shutdown.append(self.drain)
+        return app
+
+def run_webhook(dp, bot, on_startup, on_shutdown):
+    """Запуск бота в режиме webhook"""
+    if not config.webhook_secret:
+        raise RuntimeError("WEBHOOK_SECRET must be set in webhook mode")
+    sink = None
+    if config.stream_shards:
+        from streams import publish_update
+        sink = publish_update
+    server = WebhookServer(
+        dp, bot, config.webhook_secret, config.webhook_workers, config.webhook_queue_size, sink
+    )
+    app = server.app()
+
+    async def startup(app):
+        await bot.set_webhook(
+            config.webhook_url + config.webhook_path,
+            secret_token=config.webhook_secret,
+            drop_pending_updates=False
+        )
+        await on_startup(dp)
+
+    async def shutdown(app):
+        await on_shutdown(dp)
+
+    app.on_startup.append(startup)
+    # Очереди дренируются раньше, чем закрываются сессии и Redis
+    app.on_cleanup.append(shutdown)
+    web.run_app(app, host=config.webhook_host, port=config.webhook_port)